@@ -0,0 +1,169 @@
+import argparse
+import time
+import tkinter as tk
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from camera_service import CameraService
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class CameraPreview:
+    """Shows camera frames on a Tk canvas through a single, reused image item
+
+    Frames are resized and colour converted into preallocated buffers and
+    pasted straight into one PhotoImage, so there is no PNG round trip and no
+    new canvas items per frame. Drawing runs on the Tk thread via after(),
+    and the refresh interval backs off whenever the event loop can't keep up.
+    """
+
+    def __init__(self, canvas, camera, width=640, height=480, max_fps=30.0, min_fps=5.0):
+        self.canvas = canvas
+        self.camera = camera
+        self.width = width
+        self.height = height
+        self.min_interval = 1.0 / max_fps
+        self.max_interval = 1.0 / min_fps
+        self.interval = self.min_interval
+
+        self.resized = np.empty((height, width, 3), dtype=np.uint8)
+        # PIL only shares memory with 4-channel buffers, so convert straight to RGBA
+        self.rgba = np.empty((height, width, 4), dtype=np.uint8)
+        self.rgba[...] = 255
+        self.buffer = Image.frombuffer('RGBA', (width, height), self.rgba, 'raw', 'RGBA', 0, 1)
+        self.photo = ImageTk.PhotoImage(self.buffer)
+
+        # Keep the preview below overlays such as the status circle
+        self.image_item = canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
+        canvas.tag_lower(self.image_item)
+
+        self.running = False
+        self.generation = 0
+        self.last_frame_id = 0
+        self.scheduled_at = None
+        self.frames_shown = 0
+        self.frames_skipped = 0
+
+    def start(self):
+        """Begin refreshing the canvas; must be called from the Tk thread"""
+        self.generation += 1
+        self.running = True
+        self.interval = self.min_interval
+        self._schedule(self.generation)
+
+    def stop(self):
+        """Stop refreshing; safe to call from any thread, the pending tick just won't reschedule"""
+        self.running = False
+
+    @property
+    def fps(self):
+        """Current target refresh rate"""
+        return 1.0 / self.interval
+
+    def _schedule(self, generation):
+        """Queue the next refresh on the Tk event loop"""
+        self.scheduled_at = time.perf_counter() + self.interval
+        self.canvas.after(int(self.interval * 1000), self._tick, generation)
+
+    def _tick(self, generation):
+        """Draw the newest frame, if there is one, and adapt the refresh interval"""
+        if not self.running or generation != self.generation:
+            return
+
+        start = time.perf_counter()
+        lateness = max(0.0, start - self.scheduled_at)
+
+        camera_frame = self.camera.latest()
+        if camera_frame is not None and camera_frame.frame_id != self.last_frame_id:
+            if self.last_frame_id:
+                self.frames_skipped += max(0, camera_frame.frame_id - self.last_frame_id - 1)
+            self.last_frame_id = camera_frame.frame_id
+            self.draw(camera_frame.image)
+            self.frames_shown += 1
+
+        # A late tick or an expensive draw means the display can't take frames this fast
+        busy = lateness + time.perf_counter() - start
+        if busy > self.interval * 0.5:
+            self.interval = min(self.max_interval, self.interval * 1.25)
+        elif busy < self.interval * 0.25:
+            self.interval = max(self.min_interval, self.interval * 0.9)
+
+        self._schedule(generation)
+
+    def draw(self, image):
+        """Paste one BGR frame into the canvas image"""
+        cv2.resize(image, (self.width, self.height), dst=self.resized)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGBA, dst=self.rgba)
+        self.photo.paste(self.buffer)
+
+
+def measure_preview(seconds=600, source=0, sample_every=10.0):
+    """Run a bare preview window and report process CPU and memory over time"""
+    root = tk.Tk()
+    root.title("Camera preview measurement")
+    canvas = tk.Canvas(root, width=640, height=480, bg="black", highlightthickness=0)
+    canvas.pack()
+
+    camera = CameraService.get(source)
+    camera.acquire()
+    preview = CameraPreview(canvas, camera)
+    preview.start()
+
+    process = psutil.Process() if psutil else None
+    if process is None:
+        print("psutil is not installed, memory will not be reported")
+
+    samples = []
+    started = time.perf_counter()
+    last = {'wall': started, 'cpu': time.process_time(), 'shown': 0}
+
+    def sample():
+        now = time.perf_counter()
+        cpu = time.process_time()
+        wall = now - last['wall']
+        row = {
+            'elapsed_s': now - started,
+            'cpu_percent': 100.0 * (cpu - last['cpu']) / wall,
+            'rss_mb': process.memory_info().rss / 2 ** 20 if process else None,
+            'fps_shown': (preview.frames_shown - last['shown']) / wall,
+            'canvas_items': len(canvas.find_all()),
+        }
+        samples.append(row)
+        last.update(wall=now, cpu=cpu, shown=preview.frames_shown)
+
+        rss = f"{row['rss_mb']:.1f} MB" if process else "n/a"
+        print(f"{row['elapsed_s']:>7.0f}s  cpu {row['cpu_percent']:5.1f}%  rss {rss}  "
+              f"fps {row['fps_shown']:5.1f}  items {row['canvas_items']}")
+
+        if now - started >= seconds:
+            preview.stop()
+            camera.release()
+            root.destroy()
+        else:
+            root.after(int(sample_every * 1000), sample)
+
+    root.after(int(sample_every * 1000), sample)
+    root.mainloop()
+
+    print(f"Shown {preview.frames_shown} frames, skipped {preview.frames_skipped}")
+    if samples and process:
+        print(f"RSS {samples[0]['rss_mb']:.1f} MB -> {samples[-1]['rss_mb']:.1f} MB")
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CPU and memory of the camera preview")
+    parser.add_argument("--seconds", type=float, default=600, help="How long to run the preview")
+    parser.add_argument("--source", type=int, default=0, help="Camera device index")
+    args = parser.parse_args()
+    measure_preview(args.seconds, args.source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+# A grabbed frame; image is read-only and shared by every consumer, copy it before drawing
+CameraFrame = namedtuple("CameraFrame", ["frame_id", "timestamp", "image"])
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class ReplayCapture:
+    """VideoCapture-like reader for a video file or a directory of images
+
+    Frames are delivered at the recording's frame rate rather than as fast as
+    they decode, and the recording loops, so it behaves like a live camera.
+    Used as a local stand-in for network cameras.
+    """
+
+    def __init__(self, path, fps=None, loop=True):
+        self.path = path
+        self.loop = loop
+        self.position = 0
+
+        if os.path.isdir(path):
+            self.video = None
+            self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.fps = fps or 10.0
+        else:
+            self.video = cv2.VideoCapture(path)
+            self.files = None
+            self.fps = fps or self.video.get(cv2.CAP_PROP_FPS) or 25.0
+        self.next_frame_at = time.time()
+
+    def isOpened(self):
+        """Whether there is anything to replay"""
+        if self.video is not None:
+            return self.video.isOpened()
+        return bool(self.files)
+
+    def read(self):
+        """(ret, image) of the next frame, waiting until it is due"""
+        # Pace frames like a real device would
+        delay = self.next_frame_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame_at = max(self.next_frame_at, time.time() - 1.0) + 1.0 / self.fps
+
+        if self.video is not None:
+            ret, image = self.video.read()
+            if not ret and self.loop:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, image = self.video.read()
+            return ret, image
+
+        if self.position >= len(self.files):
+            if not self.loop or not self.files:
+                return False, None
+            self.position = 0
+        image = cv2.imread(self.files[self.position])
+        self.position += 1
+        return image is not None, image
+
+    def release(self):
+        """Close the video file"""
+        if self.video is not None:
+            self.video.release()
+
+
+def open_capture(source):
+    """Open a device index, stream URL, video file or image directory"""
+    if isinstance(source, str) and (os.path.isdir(source) or os.path.isfile(source)):
+        return ReplayCapture(source)
+    return cv2.VideoCapture(source)
+
+
+class CameraService:
+    """Owns one capture device and grabs its frames on a single thread
+
+    Consumers call acquire() / release() and read frames from a small ring
+    buffer. The device is opened on first acquire and closed linger seconds
+    after the last release, so quick hand-overs (authentication to
+    registration, say) don't pay the open and warm-up cost again. Every
+    service is closed at exit, so no grabber is left inside OpenCV while
+    the interpreter shuts down.
+    """
+
+    _services = {}
+    _services_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, source=0):
+        """The process-wide service for a capture source"""
+        with cls._services_lock:
+            if source not in cls._services:
+                cls._services[source] = cls(source)
+            return cls._services[source]
+
+    @classmethod
+    def close_all(cls):
+        """Stop every service's grabber; registered to run at exit"""
+        with cls._services_lock:
+            services = list(cls._services.values())
+        for service in services:
+            service.close()
+
+    def __init__(self, source=0, buffer_size=4, linger=5.0):
+        self.source = source
+        self.linger = linger
+        self.release_linger = linger  # linger of the last release
+
+        self.frames = deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.users = 0
+        self.released_at = None
+        self.next_frame_id = 1
+
+        self.cap = None
+        self.thread = None
+        self.running = False
+        self.opening = False
+        self.stopping = False
+
+    def acquire(self):
+        """Register a consumer, opening the device and starting the grabber if needed"""
+        with self.condition:
+            self.users += 1
+            self.released_at = None
+            while self.opening or self.stopping:
+                self.condition.wait()
+            if self.running:
+                return self.is_opened()
+            self.opening = True
+
+        # Opening can take seconds; don't hold up consumers of frames meanwhile
+        try:
+            cap = open_capture(self.source)
+        except Exception:
+            with self.condition:
+                self.users -= 1
+                self.opening = False
+                self.condition.notify_all()
+            raise
+
+        with self.condition:
+            self.cap = cap
+            self.running = True
+            self.opening = False
+            self.thread = threading.Thread(target=self._grab_loop, args=(cap,))
+            self.thread.daemon = True
+            self.thread.start()
+            self.condition.notify_all()
+            return self.is_opened()
+
+    def release(self, linger=None):
+        """Unregister a consumer; the device closes once nobody has used it for linger seconds
+
+        With linger=0 the last release stops the grabber and closes the
+        device before returning.
+        """
+        with self.condition:
+            self.users = max(0, self.users - 1)
+            if self.users:
+                return
+            self.released_at = time.time()
+            self.release_linger = self.linger if linger is None else linger
+            thread = self.thread
+        if self.release_linger == 0 and thread is not None:
+            # Stop waiting if another consumer acquires the device meanwhile; it keeps running
+            while thread.is_alive() and not self.users:
+                thread.join(0.05)
+
+    def close(self):
+        """Stop the grabber and close the device now, whoever still holds it"""
+        with self.condition:
+            thread = self.thread
+            if thread is None:
+                return
+            self.stopping = True
+            self.condition.notify_all()
+        thread.join()
+        with self.condition:
+            self.stopping = False
+            self.condition.notify_all()
+
+    def is_opened(self):
+        """Whether the capture device is open"""
+        return self.cap is not None and self.cap.isOpened()
+
+    def _grab_loop(self, cap):
+        """Read frames as fast as the device delivers them, keeping only the newest few"""
+        while True:
+            with self.condition:
+                idle = self.users == 0 and self.released_at is not None
+                if self.stopping or (idle and time.time() - self.released_at >= self.release_linger):
+                    self.running = False
+                    self.frames.clear()
+                    self.condition.notify_all()
+                    break
+
+            ret, image = cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+
+            image.setflags(write=False)
+            with self.condition:
+                self.frames.append(CameraFrame(self.next_frame_id, time.time(), image))
+                self.next_frame_id += 1
+                self.condition.notify_all()
+
+        cap.release()
+
+    def latest(self):
+        """Newest frame, or None if nothing has been grabbed yet"""
+        with self.condition:
+            return self.frames[-1] if self.frames else None
+
+    def wait_for_frame(self, after_id=0, timeout=1.0):
+        """Block until a frame newer than after_id arrives; returns it, or None on timeout"""
+        deadline = time.time() + timeout
+        with self.condition:
+            while not self.frames or self.frames[-1].frame_id <= after_id:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.running:
+                    return None
+                self.condition.wait(remaining)
+            return self.frames[-1]
+
+    def read(self):
+        """cv2.VideoCapture-style (ret, frame) for the newest frame"""
+        frame = self.latest() or self.wait_for_frame(timeout=1.0)
+        if frame is None:
+            return False, None
+        return True, frame.image
+
+
+atexit.register(CameraService.close_all)
@@ -0,0 +1,78 @@
+import argparse
+import os
+import time
+import cv2
+import numpy as np
+
+from face_gallery import FaceGallery, compiled_gallery_files
+
+
+def load_yaml_model(model_path):
+    """Read the histograms and labels out of an OpenCV LBPH face_model.yml"""
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    histograms = np.concatenate(recognizer.getHistograms())
+    labels = recognizer.getLabels().ravel()
+    return labels, histograms
+
+
+def convert_model(model_path, shards_dir, dtype=np.float32):
+    """Convert a YAML model into per-user shards plus a compiled gallery file"""
+    labels, histograms = load_yaml_model(model_path)
+
+    gallery = FaceGallery(shards_dir, storage_dtype=dtype)
+    gallery.add_users({int(user_id): histograms[labels == user_id] for user_id in np.unique(labels)})
+    gallery.save_compiled()
+
+    print(f"Converted {len(labels)} histograms for {len(gallery)} users into {shards_dir}")
+    return gallery
+
+
+def time_call(func, repeats):
+    """Best wall-clock time of func over a few runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare_startup(model_path, shards_dir, repeats=3):
+    """Print load time and file size of the YAML model against the compiled gallery"""
+
+    def load_yaml():
+        cv2.face.LBPHFaceRecognizer_create().read(model_path)
+
+    def load_compiled():
+        FaceGallery(shards_dir)
+
+    yaml_time = time_call(load_yaml, repeats)
+    compiled_time = time_call(load_compiled, repeats)
+
+    print(f"{'format':<12}{'size (MB)':>12}{'load (ms)':>12}")
+    print(f"{'yaml':<12}{os.path.getsize(model_path) / 1e6:>12.1f}{yaml_time * 1000:>12.1f}")
+    gallery_path = compiled_gallery_files(shards_dir)[0]
+    print(f"{'compiled':<12}{os.path.getsize(gallery_path) / 1e6:>12.1f}{compiled_time * 1000:>12.1f}")
+    print(f"Compiled gallery loads {yaml_time / compiled_time:.0f}x faster")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert face_model.yml into the compiled face gallery format")
+    parser.add_argument("--model", default=os.path.join("face_data", "face_model.yml"),
+                        help="LBPH YAML model to convert")
+    parser.add_argument("--shards-dir", default=os.path.join("face_data", "shards"),
+                        help="Directory receiving the user shards and compiled gallery")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32",
+                        help="Storage type of the compiled histograms")
+    parser.add_argument("--compare", action="store_true",
+                        help="Measure startup load time of both formats after converting")
+    args = parser.parse_args()
+
+    convert_model(args.model, args.shards_dir, np.dtype(args.dtype))
+    if args.compare:
+        compare_startup(args.model, args.shards_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import math
+import time
+from collections import deque
+
+
+class SequentialAuthenticator:
+    """Multi-frame authentication decision using a sequential probability ratio test
+
+    Every frame's best face is turned into a log-likelihood ratio: a match
+    closer than the confidence threshold is evidence for that user, anything
+    else is evidence against everyone. Evidence is summed per user over a
+    sliding window of frames and the test stops as soon as one user crosses
+    the accept bound or the best user falls below the reject bound. Rejection
+    on evidence waits until min_reject_time has passed, so a few blurred
+    frames or someone still turning towards the camera don't deny access.
+    """
+
+    ACCEPT = "accept"
+    REJECT = "reject"
+    CONTINUE = "continue"
+
+    def __init__(self, confidence_threshold=60, false_accept_rate=0.01, false_reject_rate=0.05,
+                 distance_scale=5.0, max_frame_evidence=3.0, max_frame_penalty=1.0,
+                 window=15, min_reject_time=3.0, timeout=10.0):
+        self.confidence_threshold = confidence_threshold
+        self.distance_scale = distance_scale  # distance units per nat of evidence
+        self.max_frame_evidence = max_frame_evidence
+        # Negative evidence is capped lower so one blurred frame can't reject on its own
+        self.max_frame_penalty = max_frame_penalty
+        self.min_reject_time = min_reject_time
+        self.timeout = timeout
+
+        # Wald's bounds for the requested error rates
+        self.accept_bound = math.log((1 - false_reject_rate) / false_accept_rate)
+        self.reject_bound = math.log(false_reject_rate / (1 - false_accept_rate))
+
+        self.evidence = deque(maxlen=window)
+        self.reset()
+
+    def reset(self):
+        """Start a new decision"""
+        self.evidence.clear()
+        self.names = {}
+        self.started_at = None
+        self.decided_at = None
+        self.frames_seen = 0
+        self.state = self.CONTINUE
+        self.user_id = None
+        self.name = None
+
+    @property
+    def time_to_decision(self):
+        """Seconds from the first frame to the decision, None while undecided"""
+        if self.decided_at is None:
+            return None
+        return self.decided_at - self.started_at
+
+    def frame_evidence(self, confidence):
+        """Log-likelihood ratio contributed by one match distance"""
+        llr = (self.confidence_threshold - confidence) / self.distance_scale
+        return max(-self.max_frame_penalty, min(self.max_frame_evidence, llr))
+
+    def scores(self):
+        """Accumulated evidence per user over the window; None holds evidence against everyone"""
+        against_all = sum(llr for user_id, llr in self.evidence if user_id is None)
+        scores = {None: against_all}
+        for user_id, llr in self.evidence:
+            if user_id is not None:
+                scores[user_id] = scores.get(user_id, against_all) + llr
+        return scores
+
+    def update(self, results, now=None):
+        """Add one frame's recognition results and return ACCEPT, REJECT or CONTINUE"""
+        now = time.time() if now is None else now
+        if self.started_at is None:
+            self.started_at = now
+        if self.state != self.CONTINUE:
+            return self.state
+
+        self.frames_seen += 1
+        if results:
+            best = min(results, key=lambda result: result['confidence'])
+            user_id = best['user_id'] if best['valid'] else None
+            if user_id is not None:
+                self.names[user_id] = best['name']
+            self.evidence.append((user_id, self.frame_evidence(best['confidence'])))
+
+        if self.evidence:
+            scores = self.scores()
+            best_user = max(scores, key=scores.get)
+            if best_user is not None and scores[best_user] >= self.accept_bound:
+                return self._decide(self.ACCEPT, now, best_user)
+            if scores[best_user] <= self.reject_bound and now - self.started_at >= self.min_reject_time:
+                return self._decide(self.REJECT, now)
+
+        if now - self.started_at >= self.timeout:
+            return self._decide(self.REJECT, now)
+        return self.CONTINUE
+
+    def progress(self):
+        """Fraction of the way to accepting the current best user, for status display"""
+        if not self.evidence:
+            return 0.0
+        scores = self.scores()
+        best = max(scores.values())
+        return max(0.0, min(1.0, best / self.accept_bound))
+
+    def _decide(self, state, now, user_id=None):
+        """Record the final decision"""
+        self.state = state
+        self.decided_at = now
+        self.user_id = user_id
+        self.name = self.names.get(user_id)
+        return state
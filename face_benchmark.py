@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+from camera_service import ReplayCapture
+from face_gallery import FaceGallery, GalleryIndex, LBPH_BINS, compiled_gallery_files
+from face_recognition_module import FaceRecognition
+from face_training import rebuild_gallery
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Default LBPH layout: 8x8 grid of 256-bin cell histograms
+HISTOGRAM_DIMS = 64 * LBPH_BINS
+
+# Stages of one recognition pass, timed separately
+PIPELINE_STAGES = ("cvtColor", "detect", "resize", "features", "predict", "total")
+
+
+def synthetic_histograms(rng, count, prototype, noise=0.5):
+    """Noisy copies of a user's prototype histogram, normalised per cell like LBPH"""
+    samples = prototype * rng.gamma(1.0 / noise, noise, size=(count, len(prototype))).astype(np.float32)
+    cells = samples.reshape(count, -1, LBPH_BINS)
+    cells /= cells.sum(axis=2, keepdims=True)
+    return samples
+
+
+def synthetic_gallery(rng, user_count, samples_per_user, dtype=np.float16):
+    """Gallery of random users laid out the way FaceGallery stores them"""
+    histograms = np.empty((user_count * samples_per_user, HISTOGRAM_DIMS), dtype=dtype)
+    prototypes = []
+    for user in range(user_count):
+        prototype = rng.gamma(0.3, 1.0, size=HISTOGRAM_DIMS).astype(np.float32)
+        prototypes.append(prototype)
+        rows = slice(user * samples_per_user, (user + 1) * samples_per_user)
+        histograms[rows] = synthetic_histograms(rng, samples_per_user, prototype)
+    labels = np.repeat(np.arange(1, user_count + 1, dtype=np.int32), samples_per_user)
+    return histograms, labels, prototypes
+
+
+def time_searches(search, probes):
+    """Median latency of search over the probes, in milliseconds, and its answers"""
+    latencies = []
+    answers = []
+    for probe in probes:
+        start = time.perf_counter()
+        answers.append(search(probe)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies)), answers
+
+
+def benchmark_gallery(user_counts, samples_per_user=2, probe_count=20, candidate_users=16, seed=0):
+    """Recognition latency of exact and indexed gallery search for growing user counts"""
+    rng = np.random.default_rng(seed)
+    results = []
+
+    for user_count in user_counts:
+        histograms, labels, prototypes = synthetic_gallery(rng, user_count, samples_per_user)
+        index = GalleryIndex(histograms, labels, candidate_users)
+
+        probe_users = rng.integers(0, user_count, size=probe_count)
+        probes = [synthetic_histograms(rng, 1, prototypes[user])[0] for user in probe_users]
+
+        exact_ms, exact_answers = time_searches(index.exact_search, probes)
+        indexed_ms, indexed_answers = time_searches(index.search, probes)
+        agreement = float(np.mean([a == b for a, b in zip(exact_answers, indexed_answers)]))
+
+        results.append({
+            'users': user_count,
+            'samples': len(labels),
+            'exact_ms': exact_ms,
+            'indexed_ms': indexed_ms,
+            'agreement': agreement,
+        })
+        print(f"{user_count:>8}{len(labels):>10}{exact_ms:>12.2f}{indexed_ms:>12.2f}{agreement:>11.0%}")
+
+        del histograms, index
+
+    return results
+
+
+def percentiles(samples):
+    """p50/p90/p99 and mean of a list of millisecond timings"""
+    if not samples:
+        return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'mean': 0.0}
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'mean': float(np.mean(samples))}
+
+
+def rss_mb():
+    """Resident memory of this process, None without psutil"""
+    return psutil.Process().memory_info().rss / 2 ** 20 if psutil else None
+
+
+def synthetic_faces(rng, user_count, samples_per_user):
+    """Per-user stacks of 200x200 face-like images: a smooth random pattern, jittered and noised"""
+    faces = {}
+    for user_id in range(1, user_count + 1):
+        pattern = cv2.GaussianBlur(rng.integers(0, 256, (240, 240), dtype=np.uint8), (0, 0), 3)
+        pattern = cv2.normalize(pattern, None, 0, 255, cv2.NORM_MINMAX)
+        samples = np.empty((samples_per_user, 200, 200), dtype=np.uint8)
+        for n in range(samples_per_user):
+            dx, dy = rng.integers(0, 40, size=2)
+            sample = pattern[dy:dy + 200, dx:dx + 200].astype(np.float32)
+            sample += rng.normal(0, 4, sample.shape)
+            samples[n] = np.clip(sample, 0, 255)
+        faces[user_id] = samples
+    return faces
+
+
+def synthetic_frames(rng, faces, count, frame_size=(640, 480)):
+    """(frame, ground truth boxes) pairs with one stored face pasted into a noisy background"""
+    width, height = frame_size
+    user_ids = sorted(faces)
+    frames = []
+    for _ in range(count):
+        frame = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (0, 0), 5)
+        samples = faces[user_ids[rng.integers(len(user_ids))]]
+        side = int(rng.integers(100, min(width, height) // 2))
+        x, y = int(rng.integers(0, width - side)), int(rng.integers(0, height - side))
+        frame[y:y + side, x:x + side] = cv2.resize(samples[rng.integers(len(samples))], (side, side))
+        frames.append((cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), [(x, y, side, side)]))
+    return frames
+
+
+def recorded_frames(path, max_frames):
+    """Frames of a video file or image directory, as fast as they decode"""
+    capture = ReplayCapture(path, fps=1e9, loop=False)
+    frames = []
+    while len(frames) < max_frames:
+        ret, image = capture.read()
+        if not ret:
+            break
+        frames.append((image, []))
+    capture.release()
+    return frames
+
+
+def time_pipeline(face_system, frames, confidence_threshold=60):
+    """Per-stage latency percentiles and throughput of recognition over the frames
+
+    When detection finds nothing and the frame has ground truth boxes (synthetic
+    frames), those boxes are recognized instead so the later stages are still measured.
+    """
+    timings = {stage: [] for stage in PIPELINE_STAGES}
+    detected = 0
+    started = time.perf_counter()
+
+    for frame, truth in frames:
+        t0 = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        t1 = time.perf_counter()
+        boxes = face_system.detect_faces(gray)
+        t2 = time.perf_counter()
+        detected += len(boxes)
+        if len(boxes) == 0:
+            boxes = truth
+
+        crops = [face_system.crop_face(gray, bbox) for bbox in boxes]
+        t3 = time.perf_counter()
+        if crops:
+            histograms = face_system.extract_histograms(np.stack(crops))
+            t4 = time.perf_counter()
+            predictions = face_system.gallery.predict_batch(histograms)
+            [face_system.make_result(label, distance, bbox, confidence_threshold)
+             for (label, distance), bbox in zip(predictions, boxes)]
+        else:
+            t4 = t3
+        t5 = time.perf_counter()
+
+        for stage, (begin, end) in zip(PIPELINE_STAGES, ((t0, t1), (t1, t2), (t2, t3), (t3, t4), (t4, t5), (t0, t5))):
+            timings[stage].append((end - begin) * 1000)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'frames': len(frames),
+        'faces_detected': detected,
+        'fps': len(frames) / elapsed if elapsed else 0.0,
+        'stages_ms': {stage: percentiles(timings[stage]) for stage in PIPELINE_STAGES},
+    }
+
+
+def time_instrumentation(face_system, frames, confidence_threshold=60, rounds=3):
+    """Best recognize_batch throughput with metrics off and on, plus what the metrics recorded
+
+    The two modes are interleaved over several rounds so machine noise doesn't
+    masquerade as instrumentation overhead.
+    """
+    images = [frame for frame, _ in frames]
+    fps = {'disabled': 0.0, 'enabled': 0.0}
+    for _ in range(rounds):
+        for mode in fps:
+            if mode == 'enabled':
+                face_system.enable_metrics()
+            start = time.perf_counter()
+            for image in images:
+                face_system.recognize_batch([image], confidence_threshold)
+            elapsed = time.perf_counter() - start
+            fps[mode] = max(fps[mode], len(images) / elapsed if elapsed else 0.0)
+            if mode == 'enabled':
+                snapshot = face_system.metrics.snapshot()
+                face_system.disable_metrics()
+
+    return {'fps': fps, 'stages': snapshot}
+
+
+def time_gallery_load(shards_dir):
+    """Seconds and Python-allocated MB to load the gallery, compiled and from shards"""
+    results = {}
+    for mode in ("shards", "compiled"):
+        if mode == "shards":
+            for path in compiled_gallery_files(shards_dir):
+                os.remove(path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        FaceGallery(shards_dir)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[mode] = {'seconds': seconds, 'peak_alloc_mb': peak / 2 ** 20}
+    return results
+
+
+def benchmark_pipeline(user_counts, samples_per_user=5, frame_count=100, videos=(), detector=None, seed=0):
+    """Training, model load and recognition pipeline timings for growing synthetic galleries
+
+    Frames come from the given recorded videos or image directories, or are
+    synthesised from the gallery's own faces when none are given.
+    """
+    rng = np.random.default_rng(seed)
+    recorded = [(path, recorded_frames(path, frame_count)) for path in videos]
+    results = []
+
+    for user_count in user_counts:
+        data_dir = tempfile.mkdtemp(prefix="face_benchmark_")
+        try:
+            faces = synthetic_faces(rng, user_count, samples_per_user)
+            face_system = FaceRecognition(data_dir, detector=detector)
+            for user_id, samples in faces.items():
+                face_system.sample_store.add_user(user_id, samples)
+                face_system.face_data[user_id] = {'name': f"user{user_id}", 'registered_date': ""}
+
+            # Training is what the worker process runs; time it in-process
+            rss_before = rss_mb()
+            start = time.perf_counter()
+            rebuild_gallery(data_dir)
+            train_seconds = time.perf_counter() - start
+            load = time_gallery_load(face_system.gallery.shards_dir)
+            face_system.gallery.load()
+
+            replays = recorded or [("synthetic", synthetic_frames(rng, faces, frame_count))]
+            for source, frames in replays:
+                pipeline = time_pipeline(face_system, frames)
+                instrumentation = time_instrumentation(face_system, frames)
+                rss_after = rss_mb()
+                results.append({
+                    'users': user_count,
+                    'samples': user_count * samples_per_user,
+                    'source': source,
+                    'detector': face_system.detector.name,
+                    'train_seconds': train_seconds,
+                    'load': load,
+                    'rss_mb': rss_after,
+                    'rss_growth_mb': rss_after - rss_before if psutil else None,
+                    **pipeline,
+                    'instrumentation': instrumentation,
+                })
+                total = pipeline['stages_ms']['total']
+                print(f"{user_count:>8}{source[-20:]:>22}{train_seconds:>10.2f}"
+                      f"{load['compiled']['seconds'] * 1000:>11.1f}{pipeline['fps']:>9.1f}"
+                      f"{total['p50']:>9.2f}{total['p99']:>9.2f}")
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    return results
+
+
+def environment():
+    """Versions and machine details stored with the results"""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face recognition performance benchmarks")
+    parser.add_argument("--suite", nargs="+", choices=["gallery", "pipeline"], default=["gallery", "pipeline"],
+                        help="Benchmarks to run")
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        help="Gallery sizes (enrolled users) for the gallery search benchmark")
+    parser.add_argument("--samples-per-user", type=int, default=2,
+                        help="Stored histograms per synthetic user")
+    parser.add_argument("--probes", type=int, default=20, help="Searches timed per gallery size")
+    parser.add_argument("--candidates", type=int, default=16,
+                        help="Users re-ranked exactly after the centroid prefilter")
+    parser.add_argument("--pipeline-users", type=int, nargs="+", default=[10, 100],
+                        help="Gallery sizes for the training/load/recognition pipeline benchmark")
+    parser.add_argument("--pipeline-samples", type=int, default=5, help="Face images per synthetic user")
+    parser.add_argument("--frames", type=int, default=100, help="Frames replayed per pipeline run")
+    parser.add_argument("--video", nargs="*", default=[],
+                        help="Recorded video files or image directories to replay instead of synthetic frames")
+    parser.add_argument("--detector", default=None, help="Face detector backend (haar, lbp, dnn)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {'environment': environment()}
+
+    if "gallery" in args.suite:
+        print(f"{'users':>8}{'samples':>10}{'exact ms':>12}{'indexed ms':>12}{'agreement':>11}")
+        results['gallery'] = benchmark_gallery(args.users, args.samples_per_user, args.probes, args.candidates)
+
+    if "pipeline" in args.suite:
+        print(f"{'users':>8}{'source':>22}{'train s':>10}{'load ms':>11}{'fps':>9}{'p50 ms':>9}{'p99 ms':>9}")
+        results['pipeline'] = benchmark_pipeline(args.pipeline_users, args.pipeline_samples, args.frames,
+                                                 args.video, args.detector)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
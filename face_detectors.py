@@ -0,0 +1,163 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Haar and LBP cascade training window; faces smaller than this can't be detected
+CASCADE_MIN_FACE = 24
+
+
+class FaceDetector:
+    """Common interface of the face detector backends
+
+    detect() takes a grayscale image and returns an int32 (N, 4) array of
+    (x, y, w, h) boxes in that image's coordinates, and records how long the
+    call took so backends can be compared on the machine they run on.
+    """
+
+    name = "detector"
+    # Smallest face the backend can find, used to decide how far frames can be downscaled
+    min_face = CASCADE_MIN_FACE
+
+    def __init__(self):
+        self.frames = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+
+    def detect(self, gray, min_size, max_size):
+        """Face boxes between min_size and max_size pixels wide"""
+        start = time.perf_counter()
+        faces = self._detect(gray, min_size, max_size)
+        self.last_ms = (time.perf_counter() - start) * 1000
+        self.frames += 1
+        self.total_ms += self.last_ms
+
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+        return np.asarray(faces, dtype=np.int32).reshape(-1, 4)
+
+    def _detect(self, gray, min_size, max_size):
+        raise NotImplementedError
+
+    @property
+    def mean_ms(self):
+        """Average per-frame detection time so far"""
+        return self.total_ms / self.frames if self.frames else 0.0
+
+    def stats(self):
+        """Per-frame latency summary"""
+        return {
+            'backend': self.name,
+            'frames': self.frames,
+            'last_ms': self.last_ms,
+            'mean_ms': self.mean_ms,
+        }
+
+
+class CascadeDetector(FaceDetector):
+    """OpenCV cascade classifier (Haar or LBP features, depending on the file)"""
+
+    def __init__(self, cascade_path, scale_factor=1.3, min_neighbors=5):
+        super().__init__()
+        if not os.path.exists(cascade_path):
+            raise FileNotFoundError(f"Cascade file not found: {cascade_path}")
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load cascade: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def _detect(self, gray, min_size, max_size):
+        return self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors,
+                                             minSize=(min_size, min_size),
+                                             maxSize=(max_size, max_size))
+
+
+class HaarDetector(CascadeDetector):
+    """Haar cascade shipped with OpenCV; the original detector"""
+
+    name = "haar"
+
+    def __init__(self, cascade_path=None, scale_factor=1.3, min_neighbors=5):
+        if cascade_path is None:
+            cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        super().__init__(cascade_path, scale_factor, min_neighbors)
+
+
+class LBPCascadeDetector(CascadeDetector):
+    """LBP cascade; several times faster than Haar on CPU at a small accuracy cost
+
+    OpenCV's pip wheels don't ship LBP cascades, so the file
+    (e.g. lbpcascade_frontalface_improved.xml) has to be supplied locally.
+    """
+
+    name = "lbp"
+
+    def __init__(self, cascade_path="models/lbpcascade_frontalface_improved.xml",
+                 scale_factor=1.1, min_neighbors=3):
+        super().__init__(cascade_path, scale_factor, min_neighbors)
+
+
+class DNNDetector(FaceDetector):
+    """SSD face detector run through cv2.dnn from a locally supplied model
+
+    Works with the res10 300x300 SSD (Caffe .caffemodel + deploy.prototxt,
+    or TensorFlow .pb + .pbtxt) and with ONNX exports using the same output
+    layout of (image, class, confidence, x1, y1, x2, y2) rows.
+    """
+
+    name = "dnn"
+    min_face = 20
+
+    def __init__(self, model_path, config_path=None, input_size=(300, 300),
+                 confidence=0.5, mean=(104.0, 177.0, 123.0)):
+        super().__init__()
+        for path in (model_path, config_path):
+            if path is not None and not os.path.exists(path):
+                raise FileNotFoundError(f"Detector model file not found: {path}")
+        self.net = cv2.dnn.readNet(model_path, config_path or "")
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = tuple(input_size)
+        self.confidence = confidence
+        self.mean = mean
+
+    def _detect(self, gray, min_size, max_size):
+        height, width = gray.shape[:2]
+        image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(image, 1.0, self.input_size, self.mean)
+        self.net.setInput(blob)
+        detections = self.net.forward().reshape(-1, 7)
+
+        detections = detections[detections[:, 2] >= self.confidence]
+        boxes = detections[:, 3:7] * np.array([width, height, width, height], dtype=np.float32)
+        boxes = np.clip(boxes, 0, [width, height, width, height])
+        boxes[:, 2:] -= boxes[:, :2]
+
+        sizes = boxes[:, 2]
+        return np.round(boxes[(sizes >= min_size) & (sizes <= max_size)])
+
+
+DETECTOR_BACKENDS = {
+    'haar': HaarDetector,
+    'lbp': LBPCascadeDetector,
+    'dnn': DNNDetector,
+}
+
+
+def create_detector(config=None):
+    """Build a detector from a backend name or a {'backend': name, **options} config"""
+    if config is None:
+        config = 'haar'
+    if isinstance(config, FaceDetector):
+        return config
+    if isinstance(config, str):
+        config = {'backend': config}
+
+    options = dict(config)
+    backend = options.pop('backend', 'haar')
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown face detector backend '{backend}', "
+                         f"expected one of {', '.join(DETECTOR_BACKENDS)}")
+    return DETECTOR_BACKENDS[backend](**options)
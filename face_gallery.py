@@ -0,0 +1,382 @@
+import glob
+import os
+import struct
+import threading
+import time
+import numpy as np
+
+# Compiled gallery file layout:
+#   header    magic, version, histogram dtype, user count, row count, histogram length, centroid length
+#   manifest  one (user_id, row count, shard mtime) record per user, used to detect stale files
+#   labels    int32[rows]
+#   data      histograms[rows, dims] as float32 or float16
+#   centroids float32[users, centroid dims] for the search prefilter
+# Every save writes a new gallery-<time_ns>-<pid>.bin rather than replacing the
+# old file: the app keeps the current one memory-mapped, and Windows can't
+# replace or delete a mapped file. Loads use the newest; older ones are
+# removed once nothing maps them any more.
+GALLERY_MAGIC = b"LBPG"
+GALLERY_VERSION = 2
+GALLERY_HEADER = struct.Struct("<4sHHIIII")
+GALLERY_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+MANIFEST_DTYPE = np.dtype([("user_id", "<i4"), ("rows", "<i4"), ("mtime_ns", "<i8")])
+
+# LBPH uses 8-bit patterns, so every grid cell contributes 256 histogram bins
+LBPH_BINS = 256
+
+
+def chi_square_distance_matrix(probes, histograms, max_elements=1 << 22):
+    """Chi-square distances (OpenCV HISTCMP_CHISQR_ALT) between every probe and every histogram"""
+    probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+    distances = np.empty((len(probes), len(histograms)), dtype=np.float64)
+    if len(probes) == 0 or len(histograms) == 0:
+        return distances
+
+    # Work in gallery blocks so (probes x block x bins) temporaries stay bounded
+    block_size = max(1, max_elements // (len(probes) * probes.shape[1]))
+    for start in range(0, len(histograms), block_size):
+        block = np.asarray(histograms[start:start + block_size], dtype=np.float32)[None]
+        diff = block - probes[:, None]
+        total = block + probes[:, None]
+        ratio = np.divide(diff * diff, total, out=np.zeros_like(total), where=total > 0)
+        distances[:, start:start + block_size] = 2.0 * ratio.sum(axis=2)
+
+    return distances
+
+
+def chi_square_distances(histograms, probe):
+    """Chi-square distance from a single probe to every histogram"""
+    return chi_square_distance_matrix(probe, histograms)[0]
+
+
+def pool_histograms(histograms, grid=2):
+    """Sum LBPH cell histograms into a coarse grid x grid layout for cheap prefiltering"""
+    histograms = np.atleast_2d(np.asarray(histograms, dtype=np.float32))
+    dims = histograms.shape[1]
+    side = int(round((dims // LBPH_BINS) ** 0.5))
+    if side * side * LBPH_BINS != dims or side % grid:
+        # Not a square LBPH grid we know how to pool, prefilter on the full histogram
+        return histograms
+
+    cells = histograms.reshape(len(histograms), grid, side // grid, grid, side // grid, LBPH_BINS)
+    return cells.sum(axis=(2, 4)).reshape(len(histograms), grid * grid * LBPH_BINS)
+
+
+class GalleryIndex:
+    """Per-user centroid prefilter with exact re-ranking of the closest users"""
+
+    def __init__(self, histograms, labels, candidate_users=16, centroids=None):
+        # Rows are expected grouped by label, which is how FaceGallery lays them out
+        self.histograms = histograms
+        self.labels = labels
+        self.candidate_users = candidate_users
+
+        self.user_ids, self.starts, self.counts = np.unique(labels, return_index=True, return_counts=True)
+        self.centroids = centroids if centroids is not None else self.compute_centroids()
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def compute_centroids(self, users_per_block=256):
+        """Pooled mean histogram of every user"""
+        if len(self.user_ids) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+
+        blocks = []
+        for first in range(0, len(self.user_ids), users_per_block):
+            starts = self.starts[first:first + users_per_block]
+            counts = self.counts[first:first + users_per_block]
+            rows = self.histograms[starts[0]:starts[-1] + counts[-1]]
+            sums = np.add.reduceat(rows, starts - starts[0], axis=0, dtype=np.float32)
+            blocks.append(pool_histograms(sums / counts[:, None]))
+        return np.concatenate(blocks)
+
+    def exact_search(self, probe):
+        """Linear scan over every stored histogram, exactly what LBPH predict does"""
+        return self.exact_search_batch(probe)[0]
+
+    def exact_search_batch(self, probes):
+        """Linear scan of the whole gallery for a batch of probes in one distance matrix"""
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        if len(self.labels) == 0:
+            return [(-1, float("inf"))] * len(probes)
+
+        distances = chi_square_distance_matrix(probes, self.histograms)
+        best = distances.argmin(axis=1)
+        return [(int(self.labels[b]), float(distances[i, b])) for i, b in enumerate(best)]
+
+    def search(self, probe):
+        """Return (label, distance) of the nearest histogram among the closest users"""
+        return self.search_batch(probe)[0]
+
+    def search_batch(self, probes):
+        """Nearest (label, distance) for each probe, prefiltering users by centroid"""
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        if len(self.user_ids) <= self.candidate_users:
+            return self.exact_search_batch(probes)
+
+        coarse_distances = chi_square_distance_matrix(pool_histograms(probes), self.centroids)
+        candidates = np.argpartition(coarse_distances, self.candidate_users, axis=1)[:, :self.candidate_users]
+
+        results = []
+        for probe, users in zip(probes, candidates):
+            rows = np.concatenate([np.arange(self.starts[u], self.starts[u] + self.counts[u]) for u in users])
+            distances = chi_square_distances(self.histograms[rows], probe)
+            nearest = int(np.argmin(distances))
+            results.append((int(self.labels[rows[nearest]]), float(distances[nearest])))
+        return results
+
+
+def write_gallery_file(path, manifest, index, dtype=np.float32):
+    """Write histograms, labels and search centroids into a single compiled gallery file"""
+    dtype = np.dtype(dtype).newbyteorder("<")
+    dtype_code = next(code for code, known in GALLERY_DTYPES.items() if known == dtype)
+    rows = len(index.labels)
+    dims = index.histograms.shape[1] if rows else 0
+    centroid_dims = index.centroids.shape[1] if rows else 0
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(GALLERY_HEADER.pack(GALLERY_MAGIC, GALLERY_VERSION, dtype_code,
+                                    len(manifest), rows, dims, centroid_dims))
+        f.write(np.asarray(manifest, dtype=MANIFEST_DTYPE).tobytes())
+        f.write(np.asarray(index.labels, dtype="<i4").tobytes())
+        f.write(np.ascontiguousarray(index.histograms, dtype=dtype).tobytes())
+        f.write(np.ascontiguousarray(index.centroids, dtype="<f4").tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_gallery_header(path):
+    """Header fields of a compiled gallery file"""
+    with open(path, 'rb') as f:
+        header = f.read(GALLERY_HEADER.size)
+    if len(header) < GALLERY_HEADER.size or header[:4] != GALLERY_MAGIC:
+        raise ValueError(f"{path} is not a compiled face gallery")
+    return GALLERY_HEADER.unpack(header)
+
+
+def read_gallery_file(path):
+    """Map a compiled gallery file; returns (manifest, labels, histograms, centroids) without copying"""
+    magic, version, dtype_code, user_count, rows, dims, centroid_dims = read_gallery_header(path)
+    if version != GALLERY_VERSION:
+        raise ValueError(f"Unsupported face gallery version {version}")
+
+    offset = GALLERY_HEADER.size
+    manifest = np.fromfile(path, dtype=MANIFEST_DTYPE, count=user_count, offset=offset)
+    offset += user_count * MANIFEST_DTYPE.itemsize
+    if rows == 0:
+        return manifest, np.empty(0, dtype=np.int32), np.empty((0, 0), dtype=np.float32), None
+
+    labels = np.memmap(path, dtype="<i4", mode='r', offset=offset, shape=(rows,))
+    offset += rows * 4
+    histogram_dtype = GALLERY_DTYPES[dtype_code]
+    histograms = np.memmap(path, dtype=histogram_dtype, mode='r', offset=offset, shape=(rows, dims))
+    offset += rows * dims * histogram_dtype.itemsize
+    centroids = np.memmap(path, dtype="<f4", mode='r', offset=offset, shape=(user_count, centroid_dims))
+    return manifest, labels, histograms, centroids
+
+
+def compiled_gallery_files(shards_dir):
+    """Compiled gallery files in a shards directory, newest first"""
+    return sorted(glob.glob(os.path.join(shards_dir, "gallery-*.bin")), reverse=True)
+
+
+class FaceGallery:
+    """LBPH feature histograms stored as one shard file per user"""
+
+    def __init__(self, shards_dir, storage_dtype=None, candidate_users=16):
+        self.shards_dir = shards_dir
+        os.makedirs(self.shards_dir, exist_ok=True)
+
+        # Compiled copy of all shards, mapped at startup instead of reading every shard
+        self.gallery_path = None  # the compiled file last loaded or written
+        # None keeps the type of the existing compiled gallery (float32 for a new one),
+        # so a float16 gallery stays float16 when the app or the trainer re-saves it
+        self.storage_dtype = np.dtype(storage_dtype) if storage_dtype is not None else self.compiled_dtype()
+        self.candidate_users = candidate_users
+
+        self.shards = {}
+        self.centroids = {}
+        self.mtimes = {}  # shard mtime each user's histograms were read or written at
+        # Serialises writers (registration, deletion, reloads); readers only use _index
+        self.lock = threading.RLock()
+        # The index is swapped as a whole so readers never see a half update
+        self._index = GalleryIndex(np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int32))
+        self.load()
+
+    def __len__(self):
+        return len(self.shards)
+
+    def __contains__(self, user_id):
+        return int(user_id) in self.shards
+
+    def compiled_dtype(self):
+        """Histogram storage type of the newest compiled gallery file, float32 if there is none"""
+        compiled = compiled_gallery_files(self.shards_dir)
+        if compiled:
+            try:
+                return GALLERY_DTYPES[read_gallery_header(compiled[0])[2]]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error reading compiled face gallery: {e}")
+        return np.dtype(np.float32)
+
+    def shard_path(self, user_id):
+        """Path of the shard file holding a user's histograms"""
+        return os.path.join(self.shards_dir, f"{int(user_id)}.npy")
+
+    def shard_manifest(self):
+        """Current (user_id, mtime) of every shard on disk, from directory metadata only"""
+        entries = []
+        for shard_name in os.listdir(self.shards_dir):
+            user_id, ext = os.path.splitext(shard_name)
+            if ext != ".npy" or not user_id.isdigit():
+                continue
+            entries.append((int(user_id), os.stat(os.path.join(self.shards_dir, shard_name)).st_mtime_ns))
+        return sorted(entries)
+
+    def load(self):
+        """Map the compiled gallery if it is up to date, otherwise rebuild it from the shards"""
+        with self.lock:
+            compiled = compiled_gallery_files(self.shards_dir)
+            if compiled:
+                try:
+                    manifest, labels, histograms, centroids = read_gallery_file(compiled[0])
+                    on_disk = self.shard_manifest()
+                    if [(int(m["user_id"]), int(m["mtime_ns"])) for m in manifest] == on_disk:
+                        self._use_compiled(manifest, labels, histograms, centroids)
+                        self.gallery_path = compiled[0]
+                        self.remove_old_compiled()
+                        print(f"Loaded compiled face gallery for {len(self.shards)} users")
+                        return
+                except (OSError, ValueError) as e:
+                    print(f"Error loading compiled face gallery: {e}")
+
+            self.load_shards()
+            self.save_compiled()
+
+    def _use_compiled(self, manifest, labels, histograms, centroids):
+        """Serve matching straight from the mapped gallery file"""
+        self.shards = {}
+        self.centroids = {}
+        self.mtimes = {}
+        start = 0
+        for position, entry in enumerate(manifest):
+            rows = int(entry["rows"])
+            self.shards[int(entry["user_id"])] = histograms[start:start + rows]
+            self.centroids[int(entry["user_id"])] = centroids[position]
+            self.mtimes[int(entry["user_id"])] = int(entry["mtime_ns"])
+            start += rows
+        self._index = GalleryIndex(histograms, labels, self.candidate_users, centroids)
+
+    def load_shards(self):
+        """Load every user shard from disk"""
+        self.shards = {}
+        self.centroids = {}
+        self.mtimes = {}
+        for user_id, mtime_ns in self.shard_manifest():
+            try:
+                self.shards[user_id] = np.load(self.shard_path(user_id))
+                self.centroids[user_id] = pool_histograms(self.shards[user_id].mean(axis=0))[0]
+                self.mtimes[user_id] = mtime_ns
+            except (OSError, ValueError) as e:
+                print(f"Error loading feature shard {user_id}.npy: {e}")
+
+        self._rebuild_index()
+        if self.shards:
+            print(f"Loaded feature shards for {len(self.shards)} users")
+
+    def save_compiled(self):
+        """Write all shards into the compiled gallery file for the next startup
+
+        Users whose shard has been deleted since it was read are left out of
+        every block of the file, not just the manifest. Each user is recorded
+        with the mtime of the shard their histograms came from, so a shard
+        rewritten by another process in the meantime makes the file stale
+        rather than silently out of date.
+        """
+        with self.lock:
+            on_disk = dict(self.shard_manifest())
+            user_ids = sorted(user_id for user_id in self.shards if user_id in on_disk)
+            manifest = [(user_id, len(self.shards[user_id]), self.mtimes[user_id]) for user_id in user_ids]
+            index = self._index
+            if [int(user_id) for user_id in index.user_ids] != user_ids:
+                index = self._build_index(user_ids)
+
+            path = os.path.join(self.shards_dir, f"gallery-{time.time_ns():020d}-{os.getpid()}.bin")
+            write_gallery_file(path, manifest, index, self.storage_dtype)
+            self.gallery_path = path
+            self.remove_old_compiled()
+
+    def remove_old_compiled(self):
+        """Delete compiled files older than the one in use, plus the pre-versioning gallery.bin
+
+        A file another process still has mapped can't be deleted on Windows;
+        it is left for a later call.
+        """
+        old = [path for path in compiled_gallery_files(self.shards_dir) if path < self.gallery_path]
+        legacy = os.path.join(self.shards_dir, "gallery.bin")
+        if os.path.exists(legacy):
+            old.append(legacy)
+        for path in old:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def add_user(self, user_id, histograms):
+        """Store (or replace) a user's shard and make it live immediately"""
+        self.add_users({user_id: histograms})
+
+    def add_users(self, histograms_by_user):
+        """Store (or replace) several users' shards, rebuilding the index once"""
+        with self.lock:
+            for user_id, histograms in histograms_by_user.items():
+                histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+
+                # Write to a temporary file first so a crash never leaves a truncated shard
+                shard_path = self.shard_path(user_id)
+                tmp_path = shard_path + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, histograms)
+                os.replace(tmp_path, shard_path)
+
+                self.shards[int(user_id)] = histograms
+                self.centroids[int(user_id)] = pool_histograms(histograms.mean(axis=0))[0]
+                self.mtimes[int(user_id)] = os.stat(shard_path).st_mtime_ns
+            self._rebuild_index()
+
+    def remove_user(self, user_id):
+        """Delete a user's shard and drop it from the live gallery"""
+        with self.lock:
+            shard_path = self.shard_path(user_id)
+            if os.path.exists(shard_path):
+                os.remove(shard_path)
+
+            if self.shards.pop(int(user_id), None) is not None:
+                self.centroids.pop(int(user_id), None)
+                self.mtimes.pop(int(user_id), None)
+                self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Concatenate the shards into the matrix and index used for matching"""
+        self._index = self._build_index(sorted(self.shards))
+
+    def _build_index(self, user_ids):
+        """Search index over the given users' shards"""
+        if not user_ids:
+            return GalleryIndex(np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int32))
+
+        histograms = np.concatenate([self.shards[user_id] for user_id in user_ids])
+        labels = np.concatenate([
+            np.full(len(self.shards[user_id]), user_id, dtype=np.int32) for user_id in user_ids
+        ])
+        centroids = np.stack([self.centroids[user_id] for user_id in user_ids])
+        return GalleryIndex(histograms, labels, self.candidate_users, centroids)
+
+    def predict(self, histogram):
+        """Return (label, distance) of the nearest stored histogram, like LBPH predict"""
+        return self._index.search(histogram)
+
+    def predict_batch(self, histograms):
+        """(label, distance) for every row of histograms, scored together"""
+        return self._index.search_batch(histograms)
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import numpy as np
+
+# Bucket edges for histogram snapshots: 0.1 ms to ~1.6 s in powers of two
+DEFAULT_BUCKETS_MS = tuple(0.1 * 2 ** n for n in range(15))
+
+
+class RollingHistogram:
+    """The last size recorded values in a fixed ring buffer
+
+    Recording is an index bump and a store, so it can sit on the hot path;
+    sorting and bucketing only happen when a snapshot is asked for.
+    """
+
+    def __init__(self, size=1024):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, value):
+        """Add one value, overwriting the oldest once the ring is full"""
+        with self.lock:
+            self.values[self.count % len(self.values)] = value
+            self.count += 1
+
+    def recent(self):
+        """Copy of the values currently in the window"""
+        with self.lock:
+            return self.values[:min(self.count, len(self.values))].copy()
+
+    def snapshot(self, buckets=DEFAULT_BUCKETS_MS):
+        """Count, mean, percentiles and bucket counts of the values in the window"""
+        values = self.recent()
+        if len(values) == 0:
+            return {'count': 0, 'total': self.count}
+
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        counts, _ = np.histogram(values, bins=(0.0,) + tuple(buckets) + (np.inf,))
+        return {
+            'count': len(values),
+            'total': self.count,
+            'mean': float(values.mean()),
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'max': float(values.max()),
+            'buckets': dict(zip([f"<{edge:g}" for edge in buckets] + ["inf"], counts.tolist())),
+        }
+
+
+class PipelineMetrics:
+    """Rolling per-stage durations (ms) and per-frame counts for the face pipeline
+
+    FaceRecognition only calls into this when metrics are enabled, so the
+    disabled cost is one attribute check per stage.
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name):
+        """The histogram for a stage, created on first use"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, RollingHistogram(self.window))
+        return histogram
+
+    def record(self, stage, start):
+        """Record the time since start (a time.perf_counter() value) against a stage"""
+        self.histogram(stage).record((time.perf_counter() - start) * 1000)
+
+    def record_value(self, name, value):
+        """Record a plain value such as the number of faces in a frame"""
+        self.histogram(name).record(value)
+
+    def snapshot(self):
+        """Summary of every stage"""
+        return {name: histogram.snapshot() for name, histogram in list(self.histograms.items())}
+
+    def summary(self):
+        """One line of p50/p99 per stage, for logs"""
+        parts = []
+        for name, stats in sorted(self.snapshot().items()):
+            if stats['count']:
+                parts.append(f"{name} {stats['p50']:.1f}/{stats['p99']:.1f}")
+        return ", ".join(parts) + " (p50/p99)"
@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+
+
+class FacePrioritizer:
+    """Decides which faces of a frame get recognized, and in what order
+
+    Faces are ranked by size (nearer people are more likely to be the user
+    at the kiosk), closeness to the frame centre and, for tracked faces, how
+    long they have been in view. Only the top max_faces are recognized, fewer
+    if the estimated cost of recognizing them would exceed time_budget_ms;
+    the rest wait for a later frame. At least one face is always recognized.
+    """
+
+    def __init__(self, max_faces=None, time_budget_ms=None, size_weight=1.0, center_weight=0.5,
+                 age_weight=0.2, mature_age=30, cost_smoothing=0.2):
+        self.max_faces = max_faces
+        self.time_budget_ms = time_budget_ms
+        self.size_weight = size_weight
+        self.center_weight = center_weight
+        self.age_weight = age_weight
+        self.mature_age = mature_age  # frames after which a track gets the full age bonus
+
+        # Running estimate of how long recognizing one face takes
+        self.cost_smoothing = cost_smoothing
+        self.face_cost_ms = None
+
+    def scores(self, boxes, frame_shape, ages=None):
+        """Priority of every (x, y, w, h) box, higher first"""
+        if len(boxes) == 0:
+            return np.empty(0)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        frame_height, frame_width = frame_shape[:2]
+
+        size = np.sqrt(boxes[:, 2] * boxes[:, 3]) / min(frame_width, frame_height)
+        center_x = boxes[:, 0] + boxes[:, 2] / 2 - frame_width / 2
+        center_y = boxes[:, 1] + boxes[:, 3] / 2 - frame_height / 2
+        centrality = 1.0 - np.hypot(center_x, center_y) / math.hypot(frame_width / 2, frame_height / 2)
+
+        scores = self.size_weight * size + self.center_weight * centrality
+        if ages is not None:
+            scores += self.age_weight * np.minimum(np.asarray(ages, dtype=np.float64), self.mature_age) / self.mature_age
+        return scores
+
+    def budget(self):
+        """How many faces may be recognized this frame"""
+        limit = self.max_faces
+        if self.time_budget_ms is not None and self.face_cost_ms:
+            affordable = max(1, int(self.time_budget_ms // self.face_cost_ms))
+            limit = affordable if limit is None else min(limit, affordable)
+        return limit
+
+    def select(self, boxes, frame_shape, ages=None):
+        """Indexes of the boxes to recognize now, highest priority first"""
+        order = np.argsort(-self.scores(boxes, frame_shape, ages), kind="stable")
+        limit = self.budget()
+        if limit is not None:
+            order = order[:limit]
+        return [int(i) for i in order]
+
+    def observe(self, face_count, elapsed_ms):
+        """Update the per-face cost estimate after recognizing face_count faces"""
+        if face_count <= 0:
+            return
+        cost = elapsed_ms / face_count
+        if self.face_cost_ms is None:
+            self.face_cost_ms = cost
+        else:
+            self.face_cost_ms += self.cost_smoothing * (cost - self.face_cost_ms)
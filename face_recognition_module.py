@@ -1,30 +1,103 @@
 import cv2
+import json
+import math
 import numpy as np
 import os
 import pickle
+import shutil
+import threading
+import time
 from datetime import datetime
 
+from camera_service import CameraService
+from face_detectors import HaarDetector, create_detector
+from face_gallery import FaceGallery
+from face_metrics import PipelineMetrics
+from face_priority import FacePrioritizer
+from face_registration import RegistrationPipeline
+from face_store import FaceSampleStore
+from face_training import ModelTrainer
+from lbp_features import lbp_histograms
+
+# Typical adult face width in metres, used to turn camera distance into face size in pixels
+FACE_WIDTH_M = 0.16
 class FaceRecognition:
-    def __init__(self, data_dir="face_data"):
-        """Initialize the face recognition system"""
+    def __init__(self, data_dir="face_data", detection_width=480, camera_fov=60.0,
+                 face_distance=(0.3, 1.5), detector=None, metrics=False):
+        """Initialize the face recognition system
+
+        detection_width is the width frames are downscaled to before running the
+        detector (None detects at full resolution). camera_fov (horizontal, degrees)
+        and face_distance (nearest, farthest in metres) bound the face sizes searched.
+        detector is a backend name ('haar', 'lbp', 'dnn'), a config dict or a
+        FaceDetector; by default it is read from <data_dir>/detector.json.
+        metrics turns on per-stage timing, see enable_metrics().
+        """
         self.data_dir = data_dir
-        self.users_dir = os.path.join(data_dir, "users")
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        # Per-stage timings; None keeps the hot path free of bookkeeping
+        self.metrics = PipelineMetrics() if metrics else None
+        # Default face ordering: every face, most prominent first
+        self.prioritizer = FacePrioritizer()
+        self.users_dir = os.path.join(data_dir, "users")  # legacy PNG layout, read only to migrate
+        self.detector = self.load_detector(detector)
+
+        # Detection settings
+        self.detection_width = detection_width
+        self.camera_fov = camera_fov
+        self.face_distance = face_distance
 
         # Create directories if they don't exist
-        os.makedirs(self.users_dir, exist_ok=True)
+        os.makedirs(self.data_dir, exist_ok=True)
 
         self.face_data = {}
         self.load_face_data()
 
-        model_path = os.path.join(self.data_dir, "face_model.yml")
-        if os.path.exists(model_path):
-            try:
-                self.recognizer.read(model_path)
-                print("Face recognition model loaded successfully")
-            except Exception as e:
-                print(f"Error loading face model: {e}")
+        # Packed face crops for every user, replacing the old users/<id>/*.png layout
+        self.sample_store = FaceSampleStore(os.path.join(data_dir, "samples"))
+        self.migrate_png_samples()
+
+        # Precomputed LBPH histograms, one shard per user
+        self.gallery = FaceGallery(os.path.join(data_dir, "shards"))
+        self.model_path = os.path.join(self.data_dir, "face_model.yml")
+        self.migrate_legacy_model()
+
+        # Full rebuilds run in a worker process and are swapped in when published
+        self.store_lock = threading.Lock()
+        self.trainer = ModelTrainer(self)
+
+    def load_detector(self, config=None):
+        """Create the configured face detector, falling back to the Haar cascade"""
+        config_path = os.path.join(self.data_dir, "detector.json")
+        if config is None and os.path.exists(config_path):
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+
+        try:
+            detector = create_detector(config)
+        except (OSError, ValueError, cv2.error) as e:
+            print(f"Error loading face detector {config}: {e}, using the Haar cascade")
+            config = None
+            detector = HaarDetector()
+        print(f"Using {detector.name} face detector")
+        self.detector_config = config
+        return detector
+
+    def new_detector(self):
+        """A separate detector like the configured one, for threads detecting concurrently"""
+        if self.detector_config is None:
+            return HaarDetector()
+        # A detector instance passed in can't be copied, share it
+        return create_detector(self.detector_config)
+
+    def enable_metrics(self, window=1024):
+        """Start recording per-stage durations and faces per frame; returns the PipelineMetrics"""
+        if self.metrics is None:
+            self.metrics = PipelineMetrics(window)
+        return self.metrics
+
+    def disable_metrics(self):
+        """Stop recording timings"""
+        self.metrics = None
 
     def load_face_data(self):
         """Load face metadata"""
@@ -40,119 +113,326 @@ class FaceRecognition:
         with open(data_file, 'wb') as f:
             pickle.dump(self.face_data, f)
 
-    def register_new_user(self, user_name, capture_count=30):
-        """Register a new user by capturing face images"""
-        user_id = len(self.face_data) + 1
-        # user_id = max(self.face_data.keys(), default=0) + 1
-        user_dir = os.path.join(self.users_dir, str(user_id))
-        os.makedirs(user_dir, exist_ok=True)
-
-        cap = cv2.VideoCapture(0)
-        count = 0
-
-        while count < capture_count:
-            ret, frame = cap.read()
-            if not ret:
-                continue
-
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-
-            for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                face_sample = gray[y:y+h, x:x+w]
-                face_sample = cv2.resize(face_sample, (200, 200))
-                img_path = os.path.join(user_dir, f"{count}.png")
-                cv2.imwrite(img_path, face_sample)
-                count += 1
-
-            cv2.imshow('Registration', frame)
-            cv2.waitKey(100)
+    def register_new_user(self, user_name, capture_count=20):
+        """Register a new user by capturing face images, showing the camera until done"""
+        pipeline = self.start_registration(user_name, capture_count)
+
+        reported = 0
+        while not pipeline.finished:
+            camera_frame = pipeline.camera.latest()
+            if camera_frame is not None:
+                frame = camera_frame.image.copy()
+                if pipeline.last_box is not None:
+                    x, y, w, h = pipeline.last_box
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+                cv2.imshow('Registration', frame)
+            cv2.waitKey(30)
 
-            if count % 5 == 0:
-                print(f"Captured {count}/{capture_count} images")
+            progress = pipeline.progress()
+            if progress['accepted'] >= reported + 5:
+                reported = progress['accepted']
+                print(f"Captured {reported}/{capture_count} images")
 
-        cap.release()
         cv2.destroyAllWindows()
-
+        progress = pipeline.progress()
+        if progress['state'] != pipeline.DONE:
+            raise RuntimeError(progress['error'] or "Registration cancelled")
+        return pipeline.user_id
+
+    def start_registration(self, user_name, capture_count=20, **options):
+        """Start collecting and training a new user in the background; returns the running pipeline"""
+        # len + 1 would collide with an existing id once any user has been deleted
+        user_id = max(self.face_data.keys(), default=0) + 1
+        pipeline = RegistrationPipeline(self, user_id, user_name, capture_count, **options)
+        return pipeline.start()
+
+    def store_user(self, user_id, user_name, face_samples, histograms=None):
+        """Persist a user's samples and metadata and make them recognisable
+
+        Returns an Event that is set once the published model includes the user.
+        """
+        with self.store_lock:
+            self.sample_store.add_user(user_id, face_samples)
         self.face_data[user_id] = {
             'name': user_name,
             'registered_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-
         self.save_face_data()
-        self.train_recognizer()
-        return user_id
-
-    def train_recognizer(self):
-        """Train recognizer with all user images"""
-        face_samples = []
-        labels = []
-
-        for user_id, user_info in self.face_data.items():
-            user_dir = os.path.join(self.users_dir, str(user_id))
-            for img_name in os.listdir(user_dir):
-                img_path = os.path.join(user_dir, img_name)
-                img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                if img is not None:
-                    face_samples.append(img)
-                    labels.append(int(user_id))
 
-        if face_samples:
-            self.recognizer.train(face_samples, np.array(labels))
-            self.recognizer.save(os.path.join(self.data_dir, "face_model.yml"))
-            print("Model trained and saved with all users.")
+        if histograms is None:
+            return self.trainer.request([user_id])
 
-    def recognize_face(self, frame,confidence_threshold=60):
-        """Recognize face in the given frame"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        # Registration already computed the histograms while checking for duplicates,
+        # so the user is live at once and the worker only has to republish
+        self.gallery.add_user(user_id, histograms)
+        print(f"Model updated with {len(histograms)} images for user {user_id}.")
+        return self.trainer.request([])
 
-        results = []
-        MIN_CONFIDENCE = confidence_threshold  # Lower is better in OpenCV LBPH
+    def migrate_png_samples(self):
+        """Pack users/<id>/*.png images into the sample store (one-time)"""
+        if not os.path.isdir(self.users_dir):
+            return
+
+        for user_dir_name in os.listdir(self.users_dir):
+            user_dir = os.path.join(self.users_dir, user_dir_name)
+            if not user_dir_name.isdigit() or not os.path.isdir(user_dir):
+                continue
 
+            face_samples = []
+            for img_name in sorted(os.listdir(user_dir)):
+                img = cv2.imread(os.path.join(user_dir, img_name), cv2.IMREAD_GRAYSCALE)
+                if img is not None:
+                    face_samples.append(cv2.resize(img, FaceSampleStore.SAMPLE_SHAPE))
+
+            user_id = int(user_dir_name)
+            if face_samples and user_id in self.face_data and user_id not in self.sample_store:
+                self.sample_store.add_user(user_id, face_samples)
+            shutil.rmtree(user_dir)
+
+        shutil.rmtree(self.users_dir, ignore_errors=True)
+        print("Migrated face images to the packed sample store")
+
+    def migrate_legacy_model(self):
+        """Split an old single-file LBPH model into per-user shards (one-time)"""
+        missing = [user_id for user_id in self.face_data if user_id not in self.gallery]
+        if not missing or not os.path.exists(self.model_path):
+            return
+
+        try:
+            legacy = cv2.face.LBPHFaceRecognizer_create()
+            legacy.read(self.model_path)
+            histograms = np.concatenate(legacy.getHistograms())
+            labels = legacy.getLabels().ravel()
+        except Exception as e:
+            print(f"Error loading face model: {e}")
+            return
+
+        for user_id in missing:
+            user_rows = labels == int(user_id)
+            if user_rows.any():
+                self.gallery.add_user(user_id, histograms[user_rows])
+        self.gallery.save_compiled()
+        print(f"Migrated {self.model_path} to per-user feature shards")
+
+    def extract_histograms(self, face_samples):
+        """Compute LBPH histograms for a stack of 200x200 grayscale faces"""
+        return lbp_histograms(face_samples)
+
+    def delete_user(self, user_id):
+        """Remove a user's metadata, images and feature shard"""
+        self.face_data.pop(user_id, None)
+        self.save_face_data()
+        self.gallery.remove_user(user_id)
+        with self.store_lock:
+            self.sample_store.remove_user(user_id)
+        self.trainer.request([])
+
+    def train_recognizer(self, wait=True):
+        """Rebuild every user's feature shard in the training worker (maintenance only)
+
+        Recognition keeps running on the current model until the rebuilt one
+        is published. Returns an Event set once it is live.
+        """
+        # Reclaim space left behind by deleted users while we're doing maintenance anyway
+        with self.store_lock:
+            if self.sample_store.garbage_rows():
+                self.sample_store.compact()
+
+        done = self.trainer.request()
+        if wait:
+            done.wait()
+            print("Model trained and saved with all users.")
+        return done
+
+    def face_size_range(self, frame_width):
+        """Expected (min, max) face width in pixels for a frame of the given width"""
+        focal_px = frame_width / (2 * math.tan(math.radians(self.camera_fov) / 2))
+        nearest, farthest = self.face_distance
+        return focal_px * FACE_WIDTH_M / farthest, focal_px * FACE_WIDTH_M / nearest
+
+    def detection_scale(self, frame_width):
+        """Downscale factor for detection, never shrinking the smallest expected face below the detector's minimum"""
+        if not self.detection_width or frame_width <= self.detection_width:
+            return 1.0
+        min_face, _ = self.face_size_range(frame_width)
+        scale = self.detection_width / frame_width
+        return min(1.0, max(scale, self.detector.min_face / min_face))
+
+    def detect_faces(self, gray, roi=None, detector=None):
+        """Face bounding boxes (x, y, w, h) in full-resolution coordinates of a grayscale frame
+
+        roi (x, y, w, h) restricts the search to part of the frame. detector
+        overrides self.detector, for callers on other threads.
+        """
+        detector = detector or self.detector
+        frame_height, frame_width = gray.shape[:2]
+        scale = self.detection_scale(frame_width)
+
+        offset_x, offset_y = 0, 0
+        region = gray
+        if roi is not None:
+            x, y, w, h = roi
+            offset_x, offset_y = max(0, x), max(0, y)
+            region = gray[offset_y:min(frame_height, y + h), offset_x:min(frame_width, x + w)]
+            if region.size == 0:
+                return np.empty((0, 4), dtype=np.int32)
+
+        small = region
+        if scale < 1.0:
+            small = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        # Face sizes depend on the whole frame's width, not the region's
+        min_face, max_face = self.face_size_range(frame_width * scale)
+        min_side = max(detector.min_face, int(min_face))
+        max_side = max(min_side, int(math.ceil(max_face)))
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        faces = detector.detect(small, min_side, max_side)
+        if metrics is not None:
+            metrics.record("detect", start)
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+
+        # Map boxes back so crops are taken from the full-resolution frame
+        faces = np.round(np.asarray(faces, dtype=np.float64) / scale).astype(np.int32)
+        faces[:, 0] += offset_x
+        faces[:, 1] += offset_y
+        faces[:, 2] = np.minimum(faces[:, 2], frame_width - faces[:, 0])
+        faces[:, 3] = np.minimum(faces[:, 3], frame_height - faces[:, 1])
+        return faces
+
+    def make_result(self, label, confidence, bbox, confidence_threshold):
+        """Build the result dict for one scored face"""
+        if confidence < confidence_threshold and label in self.face_data:
+            return {
+                'name': self.face_data[label]['name'],
+                'user_id': label,
+                'confidence': confidence,
+                'bbox': bbox,
+                'valid':True
+            }
+        return {
+            'name': "Unknown",
+            'user_id': None,
+            'confidence': confidence,
+            'bbox': bbox,
+            'valid':False
+        }
 
-        for (x, y, w, h) in faces:
-            face = gray[y:y+h, x:x+w]
-            face = cv2.resize(face, (200, 200))
+    def recognize_face(self, frame,confidence_threshold=60):
+        """Recognize every face in the given frame"""
+        results = self.recognize_batch([frame], confidence_threshold)[0]
+        for result in results:
+            print(f"Predicted: {result['name']}, Confidence: {result['confidence']:.2f}")
+        return results
 
-            try:
-                label, confidence = self.recognizer.predict(face)
-                print(f"Predicted: {label}, Confidence: {confidence:.2f}")
-
-                if confidence < MIN_CONFIDENCE and label in self.face_data:
-                    name = self.face_data[label]['name']
-                    results.append({
-                        'name': name,
-                        'confidence': confidence,
-                        'bbox': (x, y, w, h),
-                        'valid':True
-                    })
-                else:
-                    results.append({
-                        'name': "Unknown",
-                        'confidence': confidence,
-                        'bbox': (x, y, w, h),
-                        'valid':False
-                    })
-            except Exception as e:
-                print(f"Recognition error: {e}")
-
-        
- 
+    def recognize_batch(self, frames, confidence_threshold=60, prioritizer=None):
+        """Recognize faces across several frames, scoring every crop in one batch
+
+        Returns one result list per frame, in the same order as frames, with
+        each frame's faces ranked by the prioritizer (self.prioritizer by
+        default); faces beyond its per-frame budget are left out.
+        Lower confidence is better, as with OpenCV LBPH.
+        """
+        prioritizer = prioritizer or self.prioritizer
+        face_counts = []
+        crops = []
+        boxes = []
+        for frame in frames:
+            gray = self.to_gray(frame)
+            faces = self.detect_faces(gray)
+            faces = faces[prioritizer.select(faces, gray.shape)]
+            face_counts.append(len(faces))
+            crops.extend(self.crop_faces(gray, faces))
+            boxes.extend(faces)
+            if self.metrics is not None:
+                self.metrics.record_value("faces", len(faces))
+
+        start = time.perf_counter()
+        scored = self.score_crops(crops, boxes, confidence_threshold)
+        prioritizer.observe(len(crops), (time.perf_counter() - start) * 1000)
+        if not scored:
+            return [[] for _ in frames]
+
+        results = []
+        start = 0
+        for count in face_counts:
+            results.append(scored[start:start + count])
+            start += count
         return results
 
-   
-    def start_recognition(self):
+    def to_gray(self, frame):
+        """Grayscale version of a BGR frame (grayscale frames are returned as is)"""
+        if frame.ndim == 2:
+            return frame
+        metrics = self.metrics
+        if metrics is None:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        metrics.record("cvtColor", start)
+        return gray
+
+    def crop_face(self, gray, bbox):
+        """The 200x200 recognition crop of one face box"""
+        x, y, w, h = bbox
+        return cv2.resize(gray[y:y+h, x:x+w], (200, 200))
+
+    def crop_faces(self, gray, boxes):
+        """Recognition crops of several face boxes of one frame"""
+        metrics = self.metrics
+        if metrics is None or len(boxes) == 0:
+            return [self.crop_face(gray, bbox) for bbox in boxes]
+        start = time.perf_counter()
+        crops = [self.crop_face(gray, bbox) for bbox in boxes]
+        metrics.record("resize", start)
+        return crops
+
+    def recognize_boxes(self, gray, boxes, confidence_threshold=60):
+        """Recognize already located faces of one grayscale frame together"""
+        return self.score_crops(self.crop_faces(gray, boxes), boxes, confidence_threshold)
+
+    def score_crops(self, crops, boxes, confidence_threshold):
+        """Match face crops against the gallery in one batch; empty list on failure"""
+        if not crops:
+            return []
+
+        metrics = self.metrics
+        try:
+            if metrics is None:
+                predictions = self.gallery.predict_batch(self.extract_histograms(np.stack(crops)))
+            else:
+                start = time.perf_counter()
+                histograms = self.extract_histograms(np.stack(crops))
+                metrics.record("features", start)
+                start = time.perf_counter()
+                predictions = self.gallery.predict_batch(histograms)
+                metrics.record("predict", start)
+        except Exception as e:
+            print(f"Recognition error: {e}")
+            return []
+
+        return [
+            self.make_result(label, confidence, tuple(int(v) for v in bbox), confidence_threshold)
+            for (label, confidence), bbox in zip(predictions, boxes)
+        ]
+
+    def start_recognition(self, source=0):
         """Start continuous face recognition"""
-        cap = cv2.VideoCapture(0)
+        camera = CameraService.get(source)
+        camera.acquire()
+        tracker = FaceTracker(self)
+        last_frame_id = 0
 
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            camera_frame = camera.wait_for_frame(last_frame_id)
+            if camera_frame is None:
                 continue
+            last_frame_id = camera_frame.frame_id
+            frame = camera_frame.image.copy()
 
-            results = self.recognize_face(frame)
+            results = tracker.update(frame)
             
             # First check if any faces were detected
             if not results:
@@ -186,9 +466,185 @@ class FaceRecognition:
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
-        cap.release()
+        camera.release()
         cv2.destroyAllWindows()
 
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+class FaceTrack:
+    """A face followed across frames, carrying its recognition result"""
+
+    def __init__(self, track_id, bbox):
+        self.track_id = track_id
+        self.bbox = bbox        # full-resolution (x, y, w, h)
+        self.template = None    # grayscale patch at tracking scale
+        self.confidence = 1.0   # last template match score
+        self.age = 0            # frames since the track was created
+        self.result = None      # recognition result, reused until the face is lost
+
+
+class FaceTracker:
+    """Follows detected faces with template matching so detection and recognition run rarely
+
+    Full-frame detection runs every redetect_interval frames (to pick up new
+    faces) or when nothing is tracked. In between, each track is located by
+    template matching near its last box; a track whose match score drops below
+    min_confidence is re-detected only in a region around its last box.
+    """
+
+    def __init__(self, face_system, redetect_interval=10, min_confidence=0.6,
+                 search_margin=0.5, match_iou=0.3, detector=None, prioritizer=None):
+        self.face_system = face_system
+        self.detector = detector  # None uses the face system's own detector
+        # Decides which unidentified tracks are recognized this frame; the rest wait
+        self.prioritizer = prioritizer or FacePrioritizer()
+        self.redetect_interval = redetect_interval
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.match_iou = match_iou
+
+        self.tracks = []
+        self.frame_count = 0
+        self.next_track_id = 1
+
+    def reset(self):
+        """Forget all tracks, e.g. when the camera changes"""
+        self.tracks = []
+        self.frame_count = 0
+
+    def update(self, frame, confidence_threshold=60):
+        """Advance all tracks by one frame and return a result per tracked face"""
+        gray = self.face_system.to_gray(frame)
+        scale = self.face_system.detection_scale(gray.shape[1])
+        small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale,
+                                                     interpolation=cv2.INTER_AREA)
+        self.frame_count += 1
+
+        if not self.tracks or self.frame_count % self.redetect_interval == 0:
+            self._associate(self.face_system.detect_faces(gray, detector=self.detector), small, scale)
+        else:
+            for track in list(self.tracks):
+                if not self._follow(track, small, scale):
+                    self._redetect(track, gray, small, scale)
+
+        self._recognize(gray, confidence_threshold)
+        if self.face_system.metrics is not None:
+            self.face_system.metrics.record_value("faces", len(self.tracks))
+
+        # Most prominent faces first
+        scores = self.prioritizer.scores([track.bbox for track in self.tracks], gray.shape,
+                                         [track.age for track in self.tracks])
+        ranked = [self.tracks[i] for i in np.argsort(-scores, kind="stable")]
+        return [self._track_result(track) for track in ranked if track.result is not None]
+
+    def _expand(self, bbox, frame_width, frame_height):
+        """bbox grown by the search margin on every side, clipped to the frame"""
+        x, y, w, h = bbox
+        margin_x, margin_y = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+        x1, y1 = min(frame_width, x + w + margin_x), min(frame_height, y + h + margin_y)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def _set_box(self, track, bbox, small, scale):
+        """Move a track onto a detected box and refresh its template"""
+        track.bbox = tuple(int(v) for v in bbox)
+        x, y, w, h = (int(round(v * scale)) for v in track.bbox)
+        track.template = small[y:y+h, x:x+w].copy()
+        track.confidence = 1.0
+
+    def _follow(self, track, small, scale):
+        """Locate a track by template matching near its last position"""
+        if track.template is None or track.template.size == 0:
+            return False
+
+        scaled_box = tuple(int(round(v * scale)) for v in track.bbox)
+        x0, y0, w, h = self._expand(scaled_box, small.shape[1], small.shape[0])
+        window = small[y0:y0+h, x0:x0+w]
+        template_h, template_w = track.template.shape
+        if window.shape[0] < template_h or window.shape[1] < template_w:
+            return False
+
+        scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, best_score, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+        track.confidence = best_score
+        if best_score < self.min_confidence:
+            return False
+
+        # Only the position moves; the size stays that of the last detection
+        _, _, full_w, full_h = track.bbox
+        track.bbox = (int(round((x0 + best_x) / scale)), int(round((y0 + best_y) / scale)), full_w, full_h)
+        track.age += 1
+        return True
+
+    def _redetect(self, track, gray, small, scale):
+        """Run detection around a track whose template match failed; drop it if the face is gone"""
+        roi = self._expand(track.bbox, gray.shape[1], gray.shape[0])
+        faces = self.face_system.detect_faces(gray, roi=roi, detector=self.detector)
+        if len(faces) == 0:
+            self.tracks.remove(track)
+            return
+
+        best = max(faces, key=lambda face: box_iou(face, track.bbox))
+        self._set_box(track, best, small, scale)
+        track.age += 1
+        if track.result is not None and not track.result['valid']:
+            track.result = None  # give an unrecognized face another chance
+
+    def _associate(self, faces, small, scale):
+        """Match full-frame detections to existing tracks by overlap"""
+        unmatched = list(self.tracks)
+        tracks = []
+        for face in faces:
+            best = max(unmatched, key=lambda track: box_iou(face, track.bbox), default=None)
+            if best is not None and box_iou(face, best.bbox) >= self.match_iou:
+                unmatched.remove(best)
+                track = best
+                track.age += 1
+                if track.result is not None and not track.result['valid']:
+                    track.result = None
+            else:
+                track = FaceTrack(self.next_track_id, face)
+                self.next_track_id += 1
+            self._set_box(track, face, small, scale)
+            tracks.append(track)
+
+        # Tracks without a matching detection have left the frame
+        self.tracks = tracks
+
+    def _recognize(self, gray, confidence_threshold):
+        """Run recognition for the highest priority tracks that don't have an identity yet"""
+        pending = [track for track in self.tracks if track.result is None]
+        if not pending:
+            return
+
+        # Within the per-frame budget; deferred tracks are picked up on later frames
+        selected = self.prioritizer.select([track.bbox for track in pending], gray.shape,
+                                           [track.age for track in pending])
+        pending = [pending[i] for i in selected]
+
+        start = time.perf_counter()
+        results = self.face_system.recognize_boxes(gray, [track.bbox for track in pending], confidence_threshold)
+        self.prioritizer.observe(len(pending), (time.perf_counter() - start) * 1000)
+        for track, result in zip(pending, results):
+            track.result = result
+
+    def _track_result(self, track):
+        """The track's recognition result moved to its current box"""
+        result = dict(track.result)
+        result['bbox'] = track.bbox
+        result['track_id'] = track.track_id
+        return result
+
+
 def main():
     face_system = FaceRecognition()
 
@@ -196,21 +652,29 @@ def main():
         print("\nFace Recognition System")
         print("1. Register new user")
         print("2. Start face recognition")
-        print("3. Exit")
+        print("3. Rebuild recognition model")
+        print("4. Exit")
 
-        choice = input("Enter your choice (1-3): ")
+        choice = input("Enter your choice (1-4): ")
 
         if choice == '1':
             name = input("Enter user name: ")
             print("Starting user registration...")
-            face_system.register_new_user(name)
-            print("Registration complete!")
+            try:
+                face_system.register_new_user(name)
+                print("Registration complete!")
+            except RuntimeError as e:
+                print(f"Registration failed: {e}")
 
         elif choice == '2':
             print("Starting face recognition...")
             face_system.start_recognition()
 
         elif choice == '3':
+            print("Rebuilding recognition model from all stored images...")
+            face_system.train_recognizer()
+
+        elif choice == '4':
             print("Exiting...")
             break
 
@@ -0,0 +1,238 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from camera_service import CameraService
+from face_gallery import chi_square_distances
+from lbp_features import lbp_histograms
+
+# Passed down the stage queues to shut the pipeline down in order
+_STOP = object()
+
+
+def sharpness(face):
+    """Variance of the Laplacian; low values mean a blurred or out of focus face"""
+    return cv2.Laplacian(face, cv2.CV_64F).var()
+
+
+def asymmetry(face):
+    """Mean absolute difference between the face and its mirror image, a cheap frontal pose check"""
+    half = face.shape[1] // 2
+    left = face[:, :half].astype(np.int16)
+    right = face[:, -half:][:, ::-1].astype(np.int16)
+    return float(np.abs(left - right).mean())
+
+
+class RegistrationPipeline:
+    """Collects a new user's face samples on background threads and trains them in
+
+    Capture, quality scoring, near-duplicate rejection and storage run as
+    separate stages connected by small queues, so detection on the next frame
+    overlaps with scoring the previous one. Capture drops frames rather than
+    queueing them when a later stage is busy, and only frames with exactly
+    one face are considered. Once enough samples are accepted they are
+    written to the sample store and the user's shard is built from the
+    histograms already computed for dedup.
+    """
+
+    CAPTURING = "capturing"
+    TRAINING = "training"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, face_system, user_id, user_name, capture_count=20, min_samples=8,
+                 min_sharpness=60.0, min_face_size=80, max_asymmetry=40.0,
+                 brightness_range=(40, 220), duplicate_distance=20.0, timeout=30.0, source=0):
+        self.face_system = face_system
+        self.user_id = user_id
+        self.user_name = user_name
+        self.capture_count = capture_count
+        self.min_samples = min_samples
+        self.timeout = timeout
+
+        # Quality gates
+        self.min_sharpness = min_sharpness
+        self.min_face_size = min_face_size
+        self.max_asymmetry = max_asymmetry
+        self.brightness_range = brightness_range
+        # Chi-square distance under which a sample adds nothing over one already kept
+        self.duplicate_distance = duplicate_distance
+
+        self.camera = CameraService.get(source)
+        self.quality_queue = queue.Queue(maxsize=2)
+        self.dedup_queue = queue.Queue(maxsize=4)
+        self.storage_queue = queue.Queue()
+        self.stop_event = threading.Event()
+
+        self.lock = threading.Lock()
+        self.state = self.CAPTURING
+        self.error = None
+        self.accepted = 0
+        self.frames_seen = 0
+        self.rejected = {}
+        self.last_box = None
+        self.started_at = None
+        self.threads = []
+
+    def start(self):
+        """Start every stage on its own thread"""
+        self.started_at = time.time()
+        for stage in (self._capture_stage, self._quality_stage, self._dedup_stage, self._storage_stage):
+            thread = threading.Thread(target=stage)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def cancel(self):
+        """Stop collecting; nothing is stored for the user"""
+        with self.lock:
+            if self.state == self.CAPTURING:
+                self.state = self.CANCELLED
+        self.stop_event.set()
+
+    def wait(self, timeout=None):
+        """Block until the pipeline has finished; returns the final state"""
+        for thread in self.threads:
+            thread.join(timeout)
+        return self.state
+
+    @property
+    def finished(self):
+        """Whether the pipeline has stopped, successfully or not"""
+        return self.state in (self.DONE, self.FAILED, self.CANCELLED)
+
+    def progress(self):
+        """Snapshot of the pipeline state for display"""
+        with self.lock:
+            return {
+                'state': self.state,
+                'accepted': self.accepted,
+                'target': self.capture_count,
+                'frames': self.frames_seen,
+                'rejected': dict(self.rejected),
+                'error': self.error,
+            }
+
+    def _reject(self, reason):
+        """Count a dropped frame or sample by reason"""
+        with self.lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def _capture_stage(self):
+        """Detect faces on fresh camera frames and pass single-face crops on"""
+        self.camera.acquire()
+        last_frame_id = 0
+        try:
+            while not self.stop_event.is_set():
+                if time.time() - self.started_at > self.timeout:
+                    break
+
+                camera_frame = self.camera.wait_for_frame(last_frame_id, timeout=0.5)
+                if camera_frame is None:
+                    continue
+                last_frame_id = camera_frame.frame_id
+                with self.lock:
+                    self.frames_seen += 1
+
+                gray = cv2.cvtColor(camera_frame.image, cv2.COLOR_BGR2GRAY)
+                faces = self.face_system.detect_faces(gray)
+                if len(faces) != 1:
+                    self.last_box = None
+                    self._reject("no face" if len(faces) == 0 else "several faces")
+                    continue
+
+                x, y, w, h = faces[0]
+                self.last_box = (x, y, w, h)
+                crop = cv2.resize(gray[y:y+h, x:x+w], (200, 200))
+                try:
+                    self.quality_queue.put_nowait((crop, (x, y, w, h), gray.shape))
+                except queue.Full:
+                    # Scoring is behind, a newer frame will be along shortly
+                    self._reject("busy")
+        finally:
+            self.camera.release()
+            self.quality_queue.put(_STOP)
+
+    def _quality_stage(self):
+        """Drop small, badly framed, blurred, badly exposed or turned faces"""
+        while True:
+            item = self.quality_queue.get()
+            if item is _STOP:
+                self.dedup_queue.put(_STOP)
+                return
+
+            crop, (x, y, w, h), (frame_h, frame_w) = item
+            margin = 0.02 * frame_w
+            brightness = crop.mean()
+
+            if w < self.min_face_size:
+                self._reject("too small")
+            elif x < margin or y < margin or x + w > frame_w - margin or y + h > frame_h - margin:
+                self._reject("cut off")
+            elif not self.brightness_range[0] <= brightness <= self.brightness_range[1]:
+                self._reject("exposure")
+            elif sharpness(crop) < self.min_sharpness:
+                self._reject("blurry")
+            elif asymmetry(crop) > self.max_asymmetry:
+                self._reject("pose")
+            else:
+                self.dedup_queue.put(crop)
+
+    def _dedup_stage(self):
+        """Drop samples whose LBPH histogram is almost the same as one already kept"""
+        kept = []
+        while True:
+            crop = self.dedup_queue.get()
+            if crop is _STOP:
+                self.storage_queue.put(_STOP)
+                return
+
+            histogram = lbp_histograms(crop)[0]
+            if kept and chi_square_distances(np.stack(kept), histogram).min() < self.duplicate_distance:
+                self._reject("duplicate")
+                continue
+
+            kept.append(histogram)
+            self.storage_queue.put((crop, histogram))
+
+    def _storage_stage(self):
+        """Collect accepted samples, then store them and train the user in"""
+        samples = []
+        histograms = []
+        while True:
+            item = self.storage_queue.get()
+            if item is _STOP:
+                break
+
+            if len(samples) < self.capture_count:
+                samples.append(item[0])
+                histograms.append(item[1])
+                with self.lock:
+                    self.accepted = len(samples)
+                if len(samples) == self.capture_count:
+                    self.stop_event.set()
+
+        with self.lock:
+            if self.state == self.CANCELLED:
+                return
+            if len(samples) < self.min_samples:
+                self.state = self.FAILED
+                self.error = f"Only {len(samples)} usable face samples captured"
+                return
+            self.state = self.TRAINING
+
+        try:
+            self.face_system.store_user(self.user_id, self.user_name, samples, np.stack(histograms))
+        except Exception as e:
+            with self.lock:
+                self.state = self.FAILED
+                self.error = str(e)
+            return
+
+        with self.lock:
+            self.state = self.DONE
@@ -0,0 +1,146 @@
+import glob
+import json
+import os
+import time
+import numpy as np
+
+
+class FaceSampleStore:
+    """Packed uint8 face crops in one memory-mapped file, indexed by user id
+
+    The index names the data file it describes. compact() writes a new data
+    file and switches to it by rewriting the index, so a training worker
+    opening the store meanwhile sees either the old pair or the new one,
+    never the new data with the old row ranges.
+    """
+
+    SAMPLE_SHAPE = (200, 200)
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        self.data_path = os.path.join(store_dir, "samples.u8")  # until the index names another
+        self.index_path = os.path.join(store_dir, "samples_index.json")
+        self.sample_size = self.SAMPLE_SHAPE[0] * self.SAMPLE_SHAPE[1]
+
+        # user id -> (first row, row count) inside the data file
+        self.index = {}
+        self._samples = None
+        self.load_index()
+
+    def __contains__(self, user_id):
+        return int(user_id) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def user_ids(self):
+        """Ids of all users with stored samples"""
+        return sorted(self.index)
+
+    def load_index(self, attempts=3):
+        """Load the user id -> row range index and map the data file it refers to"""
+        for _ in range(attempts):
+            if not os.path.exists(self.index_path):
+                break
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if "users" in index:
+                self.data_path = os.path.join(self.store_dir, index["data_file"])
+                index = index["users"]
+            # Older indexes are a bare {user id: rows} mapping of samples.u8
+            self.index = {int(user_id): tuple(rows) for user_id, rows in index.items()}
+
+            # A compaction may have replaced the data file since the index was read; read it again
+            if not self.index or os.path.exists(self.data_path):
+                break
+        self._map_samples()
+
+    def save_index(self):
+        """Atomically write the row range index, naming the data file it describes"""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'data_file': os.path.basename(self.data_path),
+                'users': {str(user_id): list(rows) for user_id, rows in self.index.items()},
+            }, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _map_samples(self):
+        """(Re)map the data file after it has grown or been rewritten"""
+        row_count = 0
+        if os.path.exists(self.data_path):
+            row_count = os.path.getsize(self.data_path) // self.sample_size
+
+        if row_count == 0:
+            self._samples = np.empty((0,) + self.SAMPLE_SHAPE, dtype=np.uint8)
+        else:
+            self._samples = np.memmap(self.data_path, dtype=np.uint8, mode='r',
+                                      shape=(row_count,) + self.SAMPLE_SHAPE)
+
+    def add_user(self, user_id, samples):
+        """Append a user's face crops; replaces any samples already stored for them"""
+        samples = np.ascontiguousarray(samples, dtype=np.uint8).reshape((-1,) + self.SAMPLE_SHAPE)
+
+        with open(self.data_path, 'ab') as f:
+            start = f.tell() // self.sample_size
+            f.write(samples.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Rows of a replaced entry stay in the file until compact() runs
+        self.index[int(user_id)] = (start, len(samples))
+        self.save_index()
+        self._map_samples()
+
+    def get_user(self, user_id):
+        """Read-only (count, 200, 200) view of a user's samples straight from the mapped file"""
+        rows = self.index.get(int(user_id))
+        if rows is None:
+            return self._samples[:0]
+        start, count = rows
+        return self._samples[start:start + count]
+
+    def remove_user(self, user_id):
+        """Forget a user's samples; the rows are reclaimed by compact()"""
+        if self.index.pop(int(user_id), None) is not None:
+            self.save_index()
+
+    def garbage_rows(self):
+        """Number of rows in the data file no longer referenced by the index"""
+        live_rows = sum(count for _, count in self.index.values())
+        return len(self._samples) - live_rows
+
+    def compact(self):
+        """Rewrite the data file without rows of deleted or replaced users (maintenance only)"""
+        data_path = os.path.join(self.store_dir, f"samples-{time.time_ns():020d}.u8")
+        new_index = {}
+        with open(data_path, 'wb') as f:
+            for user_id in self.user_ids():
+                new_index[user_id] = (f.tell() // self.sample_size, self.index[user_id][1])
+                f.write(np.ascontiguousarray(self.get_user(user_id)).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Writing the index is the switch-over; the old data file stays valid until then
+        self.data_path = data_path
+        self.index = new_index
+        self.save_index()
+        self._samples = None
+        self._map_samples()
+        self.remove_old_data_files()
+
+    def remove_old_data_files(self):
+        """Delete data files the index no longer refers to
+
+        One still mapped by another process can't be deleted on Windows; it
+        is left for the next compaction.
+        """
+        for path in glob.glob(os.path.join(self.store_dir, "samples*.u8")):
+            if os.path.abspath(path) == os.path.abspath(self.data_path):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from face_gallery import FaceGallery
+from face_store import FaceSampleStore
+from lbp_features import lbp_histograms
+
+
+def rebuild_gallery(data_dir, user_ids=None):
+    """Rebuild feature shards from the sample store and publish a new compiled gallery
+
+    Runs in the training worker process. user_ids limits which shards are
+    recomputed (None means every stored user, an empty set only recompiles).
+    The compiled gallery is published as a new file next to the one the app
+    has mapped, so the app can map it as soon as this returns.
+
+    The app may delete users while this runs, so the store is re-read just
+    before publishing and any shard without samples behind it is dropped,
+    including one this rebuild wrote for a user deleted meanwhile. The app
+    queues a republish after every deletion, which sweeps up the rest.
+    """
+    store = FaceSampleStore(os.path.join(data_dir, "samples"))
+    gallery = FaceGallery(os.path.join(data_dir, "shards"))
+
+    if user_ids is None:
+        user_ids = store.user_ids()
+
+    shards = {}
+    for user_id in sorted(user_ids):
+        samples = store.get_user(user_id)
+        if len(samples):
+            shards[user_id] = lbp_histograms(samples)
+    if shards:
+        gallery.add_users(shards)
+
+    # Shards of users who no longer have samples, whether deleted before or during this rebuild
+    store.load_index()
+    for user_id in list(gallery.shards):
+        if user_id not in store:
+            gallery.remove_user(user_id)
+
+    gallery.save_compiled()
+    return len(gallery)
+
+
+class ModelTrainer:
+    """Runs gallery rebuilds in a worker process and hot-swaps the result in
+
+    Requests made while a rebuild is queued or running are merged, so a burst
+    of registrations costs one rebuild instead of one each. When a rebuild
+    finishes the app's gallery re-maps the compiled file; recognition keeps
+    using the old index until the new one is swapped in whole.
+    """
+
+    def __init__(self, face_system, coalesce_delay=1.0):
+        self.face_system = face_system
+        self.coalesce_delay = coalesce_delay
+
+        self.condition = threading.Condition()
+        self.pending = False
+        self.pending_users = set()  # None once any request asked for every user
+        self.pending_events = []
+        self.rebuilds = 0
+        self.last_error = None
+
+        self.executor = None
+        self.thread = None
+
+    def request(self, user_ids=None):
+        """Queue a rebuild of user_ids (None for everyone); returns an Event set once it's live"""
+        done = threading.Event()
+        with self.condition:
+            if user_ids is None or self.pending_users is None:
+                self.pending_users = None
+            else:
+                self.pending_users.update(int(user_id) for user_id in user_ids)
+            self.pending = True
+            self.pending_events.append(done)
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run)
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+        return done
+
+    def _run(self):
+        """Take merged requests one rebuild at a time"""
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+
+            # Give requests arriving in a burst the chance to join this rebuild
+            time.sleep(self.coalesce_delay)
+
+            with self.condition:
+                user_ids = self.pending_users
+                events = self.pending_events
+                self.pending = False
+                self.pending_users = set()
+                self.pending_events = []
+
+            self._rebuild(user_ids)
+            for done in events:
+                done.set()
+
+    def _rebuild(self, user_ids):
+        """Build in the worker process, then swap the published gallery in"""
+        if self.executor is None:
+            # spawn, not fork: the app has camera and Tk threads a forked child would inherit half of
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+        start = time.time()
+        try:
+            user_count = self.executor.submit(rebuild_gallery, self.face_system.data_dir, user_ids).result()
+            self.face_system.gallery.load()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # The worker died; start a fresh one next time
+                self.executor = None
+            self.last_error = e
+            print(f"Model rebuild failed: {e}")
+            return
+
+        self.rebuilds += 1
+        print(f"Model rebuilt for {user_count} users in {time.time() - start:.2f}s")
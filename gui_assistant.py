@@ -323,7 +323,10 @@ class AssistantGUI:
             self.add_to_conversation("Assistant not initialized yet. Please wait.")
             return
         
-        if not self.is_listening:
+        if self.is_speaking or self.assistant.audio_output.speaking:
+            # Stop button pressed while a response is being synthesized or spoken
+            self.assistant.stop_speaking()
+        elif not self.is_listening:
             # Start listening
             self.is_listening = True
             self.mic_button.config(text="🛑 Stop")
@@ -368,10 +371,24 @@ class AssistantGUI:
         if self.assistant:
             response = self.assistant.process_command(command)
             self.is_speaking = True
+            self.mic_button.config(text="🛑 Stop")
             self.update_animation_state()
-            self.assistant.speak(response)
-            self.is_speaking = False
-            self.update_animation_state()
+            utterance = None
+            try:
+                utterance = self.assistant.speak(response)
+            finally:
+                # Reset even if synthesis or playback failed, or the mic button stays a Stop button
+                self.is_speaking = False
+                if not self.is_listening:
+                    self.mic_button.config(text="🎤 Listen")
+                self.update_animation_state()
+            
+            # The user talked over the response; go straight to listening for their command
+            if utterance is not None and utterance.interrupted == "barge-in" and not self.is_listening:
+                self.is_listening = True
+                self.mic_button.config(text="🛑 Stop")
+                self.update_animation_state()
+                self.start_listening()
     
     def add_to_conversation(self, message):
         """Add a message to the conversation history"""
@@ -433,7 +450,7 @@ class EnhancedVoiceAssistant(VoiceAssistant):
         self.weather_api_key = "YOUR_API_KEY"  # Replace with your OpenWeatherMap API key
         super().__init__(name)
     
-    def speak(self, text):
+    def speak(self, text, **options):
         """Override speak method to update GUI"""
         print(f"{self.name}: {text}")
         
@@ -442,7 +459,7 @@ class EnhancedVoiceAssistant(VoiceAssistant):
             self.gui.add_to_conversation(text)
         
         # Use the original speak method for TTS
-        super().speak(text)
+        return super().speak(text, **options)
     
     def get_weather(self, city):
         """Get weather information for a city using OpenWeatherMap API"""
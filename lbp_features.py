@@ -0,0 +1,91 @@
+import math
+import numpy as np
+
+# Same defaults as cv2.face.LBPHFaceRecognizer_create()
+LBP_RADIUS = 1
+LBP_NEIGHBORS = 8
+LBP_GRID = (8, 8)
+
+
+def _sample_taps(radius, neighbors):
+    """Bilinear (offset, weight) taps of each circular neighbour, with OpenCV's float32 weights"""
+    neighbor_taps = []
+    for n in range(neighbors):
+        x = np.float32(radius * math.cos(2.0 * math.pi * n / neighbors))
+        y = np.float32(-radius * math.sin(2.0 * math.pi * n / neighbors))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = x - np.float32(fx), y - np.float32(fy)
+        weights = (
+            (np.float32(1) - tx) * (np.float32(1) - ty),
+            tx * (np.float32(1) - ty),
+            (np.float32(1) - tx) * ty,
+            tx * ty,
+        )
+        taps = zip(((fy, fx), (fy, cx), (cy, fx), (cy, cx)), weights)
+
+        # Weights around 1e-17 (sin(pi) and friends) can't move an 8-bit comparison, skip those taps
+        neighbor_taps.append([(offset, weight) for offset, weight in taps if weight > 1e-6])
+    return neighbor_taps
+
+
+def lbp_images(faces, radius=LBP_RADIUS, neighbors=LBP_NEIGHBORS):
+    """Extended (circular) LBP codes for a stack of grayscale faces, shape (N, H - 2r, W - 2r)"""
+    faces = np.asarray(faces)
+    if faces.ndim == 2:
+        faces = faces[None]
+    count, rows, cols = faces.shape
+    out_rows, out_cols = rows - 2 * radius, cols - 2 * radius
+
+    pixels = faces.astype(np.float32)
+    center = pixels[:, radius:radius + out_rows, radius:radius + out_cols]
+    epsilon = np.finfo(np.float32).eps
+    codes = np.zeros((count, out_rows, out_cols), dtype=np.uint32)
+
+    def shifted(dy, dx):
+        return pixels[:, radius + dy:radius + dy + out_rows, radius + dx:radius + dx + out_cols]
+
+    for n, taps in enumerate(_sample_taps(radius, neighbors)):
+        if len(taps) == 1 and taps[0][1] == 1:
+            t = shifted(*taps[0][0])
+        else:
+            t = sum(weight * shifted(*offset) for offset, weight in taps)
+        bit = (t > center) | (np.abs(t - center) < epsilon)
+        codes |= bit.astype(np.uint32) << n
+
+    return codes
+
+
+def lbp_histograms(faces, radius=LBP_RADIUS, neighbors=LBP_NEIGHBORS, grid=LBP_GRID, chunk_size=32):
+    """LBPH spatial histograms for a stack of faces, one float32 row per face"""
+    faces = np.asarray(faces)
+    if faces.ndim == 2:
+        faces = faces[None]
+
+    # Moderate chunks keep the float32 intermediates cache friendly
+    return np.concatenate([
+        _chunk_histograms(faces[start:start + chunk_size], radius, neighbors, grid)
+        for start in range(0, max(len(faces), 1), chunk_size)
+    ])
+
+
+def _chunk_histograms(faces, radius, neighbors, grid):
+    """Spatial histograms of one chunk of faces"""
+    codes = lbp_images(faces, radius, neighbors)
+    count, rows, cols = codes.shape
+    grid_x, grid_y = grid
+    bins = 2 ** neighbors
+
+    # OpenCV uses integer cell sizes and ignores the leftover border
+    cell_h, cell_w = rows // grid_y, cols // grid_x
+    cells = codes[:, :grid_y * cell_h, :grid_x * cell_w]
+    cells = cells.reshape(count, grid_y, cell_h, grid_x, cell_w).transpose(0, 1, 3, 2, 4)
+    cells = cells.reshape(count * grid_y * grid_x, cell_h * cell_w)
+
+    # One bincount over all cells of all faces by giving every cell its own bin range
+    offsets = (np.arange(len(cells), dtype=np.int64) * bins)[:, None]
+    counts = np.bincount((cells + offsets).ravel(), minlength=len(cells) * bins)
+
+    histograms = counts.reshape(count, grid_y * grid_x * bins).astype(np.float32)
+    histograms /= np.float32(cell_h * cell_w)
+    return histograms
@@ -1,20 +1,23 @@
 import tkinter as tk
-import cv2
 import threading
 import time
-import os
-import datetime 
 from tkinter import messagebox, ttk
 from PIL import Image, ImageTk
 
 # Import our modules
 from face_recognition_module import FaceRecognition
+from camera_service import CameraService
+from camera_preview import CameraPreview
+from face_auth import SequentialAuthenticator
+from face_priority import FacePrioritizer
 from gui_assistant import AssistantGUI
+from security_log import SecurityLog, describe
 
 
 class AuthenticationApp:
-    def __init__(self, root):
+    def __init__(self, root, camera_source=0):
         self.root = root
+        self.camera_source = camera_source  # device index, stream URL or video file
         self.root.title("Voice Assistant Authentication")
         self.root.geometry("800x600")
         
@@ -31,7 +34,7 @@ class AuthenticationApp:
         self.root.configure(bg=self.bg_color)
         
         # Initialize face recognition system
-        self.face_system = FaceRecognition()
+        self.face_system = FaceRecognition(metrics=True)
         
         # Check if face data exists
         self.has_registered_users = len(self.face_system.face_data) > 0
@@ -39,10 +42,9 @@ class AuthenticationApp:
         # Initialize animation ID
         self.animation_id = None
         
-        # Create security logs directory
+        # Security event log (imports the old auth_log.txt on first start)
         self.log_dir = "security_logs"
-        if not os.path.exists(self.log_dir):
-            os.makedirs(self.log_dir)
+        self.security_log = SecurityLog(self.log_dir)
         
         # Create and place the GUI components
         self.create_widgets()
@@ -72,6 +74,10 @@ class AuthenticationApp:
                                bg="black", highlightthickness=0)
         self.canvas.pack()
         
+        # Live preview, drawn on the Tk thread into one reused canvas image
+        self.camera = CameraService.get(self.camera_source)
+        self.preview = CameraPreview(self.canvas, self.camera, 640, 480)
+        
         # Create authentication status indicator (circle)
         self.outer_circle = self.canvas.create_oval(
             290, 430, 350, 470,  # Position at bottom center of canvas
@@ -164,103 +170,80 @@ class AuthenticationApp:
     
     def start_camera(self):
         """Start the camera for face recognition"""
-        self.cap = cv2.VideoCapture(0)
+        self.camera.acquire()
+        self.camera_acquired = True
         self.is_running = True
         
-        # Start camera thread
-        self.camera_thread = threading.Thread(target=self.update_camera)
-        self.camera_thread.daemon = True
-        self.camera_thread.start()
+        # Start the preview
+        self.preview.start()
         
         # Start recognition thread
         self.recognition_thread = threading.Thread(target=self.perform_recognition)
         self.recognition_thread.daemon = True
         self.recognition_thread.start()
     
-    def update_camera(self):
-        """Update camera feed on canvas"""
-        while self.is_running:
-            ret, frame = self.cap.read()
-            if ret:
-                # Convert frame to RGB for tkinter
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Resize if needed
-                frame_rgb = cv2.resize(frame_rgb, (640, 480))
-                
-                # Convert to PhotoImage
-                self.photo = tk.PhotoImage(
-                    data=cv2.imencode('.png', frame_rgb)[1].tobytes()
-                )
-                
-                # Update canvas
-                self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
-            
-            time.sleep(0.03)  # ~30 FPS
+    def stop_camera(self):
+        """Stop the camera threads and hand the device back to the camera service"""
+        self.is_running = False
+        self.preview.stop()
+        if getattr(self, 'camera_acquired', False):
+            self.camera_acquired = False
+            self.camera.release()
     
-   
     def perform_recognition(self):
         """Perform face recognition on camera feed"""
-        # Wait a moment for camera to initialize
-        time.sleep(1)
-        
-        recognition_interval = 1.0  # seconds between recognition attempts
-        last_recognition_time = 0
-        
         # Authentication parameters
-        max_attempts = 10  # Maximum number of recognition attempts
         confidence_threshold = 60  # Confidence threshold for authentication (lower is better)
-        attempt_count = 0
+        authenticator = SequentialAuthenticator(confidence_threshold, timeout=10.0)
+        # Only the most prominent face (biggest, most central) decides, however many bystanders are in view
+        prioritizer = FacePrioritizer(max_faces=1)
         
-        while self.is_running and attempt_count < max_attempts:
-            current_time = time.time()
+        # Score every new frame and stop as soon as the evidence is conclusive
+        last_frame_id = 0
+        while self.is_running:
+            camera_frame = self.camera.wait_for_frame(last_frame_id, timeout=0.5)
+            if camera_frame is None:
+                # No frames coming in; the authentication timeout still has to run out
+                if authenticator.update([]) == SequentialAuthenticator.REJECT:
+                    break
+                self.status_var.set("Waiting for the camera...")
+                continue
+            last_frame_id = camera_frame.frame_id
+            frame = camera_frame.image
             
-            # Only perform recognition at intervals
-            if current_time - last_recognition_time >= recognition_interval:
-                last_recognition_time = current_time
-                attempt_count += 1
+            results = self.face_system.recognize_batch([frame], confidence_threshold, prioritizer)[0]
+            decision = authenticator.update(results)
+            
+            if decision == SequentialAuthenticator.ACCEPT:
+                # Authentication successful
+                self.stop_camera()
+                user_name = authenticator.name
+                unlock_time = authenticator.time_to_decision
+                print(f"Time to unlock: {unlock_time:.2f}s over {authenticator.frames_seen} frames")
+                print(f"Face pipeline ms: {self.face_system.metrics.summary()}")
+                
+                # Update status and show success animation
+                self.status_var.set(f"Authentication successful! Welcome, {user_name}!")
+                self.show_authentication_result(True, user_name)
                 
-                ret, frame = self.cap.read()
-                if ret:
-                    # Perform face recognition
-                    results = self.face_system.recognize_face(frame,confidence_threshold)
-                    
-                    # Check if any faces were detected
-                    if not results:
-                        # No faces detected
-                        self.status_var.set(f"No face detected. Attempt {attempt_count}/{max_attempts}")
-                    else:
-                        # Process all detected faces
-                        valid_matches = [r for r in results if r['valid']]
-                        
-                        if valid_matches:
-                            # Get the user with highest confidence (lowest value) among valid matches
-                            best_match = min(valid_matches, key=lambda x: x['confidence'])
-                            
-                            # Authentication successful
-                            self.is_running = False
-                            
-                            # Update status and show success animation
-                            self.status_var.set(f"Authentication successful! Welcome, {best_match['name']}!")
-                            self.show_authentication_result(True, best_match['name'])
-                            
-                            # Log successful authentication
-                            self.log_authentication_attempt(True, best_match['name'])
-                            
-                            # Schedule launching the main application
-                            self.root.after(1500, lambda: self.launch_assistant(best_match['name']))
-                            return
-                        else:
-                            # Face detected but not recognized as a registered user
-                            self.status_var.set(f"Unrecognized face. Attempt {attempt_count}/{max_attempts}")
+                # Log successful authentication
+                self.log_authentication_attempt(True, user_name, unlock_time)
+                
+                # Schedule launching the main application
+                self.root.after(1500, lambda: self.launch_assistant(user_name))
+                return
+            
+            if decision == SequentialAuthenticator.REJECT:
+                break
             
-            time.sleep(0.1)
+            if not results:
+                self.status_var.set("No face detected. Please look at the camera.")
+            else:
+                self.status_var.set(f"Verifying... {authenticator.progress():.0%}")
         
         # If we reach here, authentication has failed
         if self.is_running:
-            self.is_running = False
-            if hasattr(self, 'cap') and self.cap.isOpened():
-                self.cap.release()
+            self.stop_camera()
             
             # Update status and show failure animation
             self.status_var.set("Authentication failed. Access denied.")
@@ -292,29 +275,19 @@ class AuthenticationApp:
         # Flash animation
         self.root.update()
     
-    def log_authentication_attempt(self, success, user_name=None):
+    def log_authentication_attempt(self, success, user_name=None, unlock_time=None):
         """Log authentication attempts for security purposes"""
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_file = os.path.join(self.log_dir, "auth_log.txt")
-        
-        with open(log_file, "a") as f:
-            if success:
-                f.write(f"{timestamp} - SUCCESSFUL LOGIN: {user_name}\n")
-            else:
-                f.write(f"{timestamp} - FAILED LOGIN ATTEMPT\n")
+        if success:
+            self.security_log.log("login", "success", user_name, unlock_time=unlock_time)
+        else:
+            self.security_log.log("login", "failure")
     
     def view_security_logs(self):
-        """Open a window to view security logs"""
-        log_file = os.path.join(self.log_dir, "auth_log.txt")
-        
-        if not os.path.exists(log_file):
-            messagebox.showinfo("Logs", "No security logs found.")
-            return
-        
+        """Open a window to page through and filter the security logs"""
         # Create logs window
         logs_window = tk.Toplevel(self.root)
         logs_window.title("Security Logs")
-        logs_window.geometry("600x400")
+        logs_window.geometry("700x500")
         logs_window.configure(bg=self.bg_color)
         
         # Create a frame for the logs
@@ -326,6 +299,23 @@ class AuthenticationApp:
                 font=("Helvetica", 16, "bold"), 
                 bg=self.bg_color, fg=self.accent_color).pack(pady=(0, 10))
         
+        # Filters
+        filters_frame = tk.Frame(logs_frame, bg=self.bg_color)
+        filters_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        user_var = tk.StringVar(value="All")
+        outcome_var = tk.StringVar(value="All")
+        event_var = tk.StringVar(value="All")
+        for label, variable, values in (
+            ("User", user_var, ["All"] + self.security_log.users()),
+            ("Outcome", outcome_var, ["All", "success", "failure"]),
+            ("Event", event_var, ["All", "login", "registration", "deletion"]),
+        ):
+            tk.Label(filters_frame, text=label, bg=self.bg_color, fg=self.text_color).pack(side=tk.LEFT, padx=(0, 5))
+            combo = ttk.Combobox(filters_frame, textvariable=variable, values=values, width=14, state="readonly")
+            combo.pack(side=tk.LEFT, padx=(0, 10))
+            combo.bind("<<ComboboxSelected>>", lambda event: show_page(None))
+        
         # Create a text widget to display logs
         log_text = tk.Text(logs_frame, wrap=tk.WORD, bg=self.panel_color, 
                           fg=self.text_color, font=("Courier", 10))
@@ -337,36 +327,78 @@ class AuthenticationApp:
         log_text.config(yscrollcommand=scrollbar.set)
         scrollbar.config(command=log_text.yview)
         
-        # Read and display logs
-        with open(log_file, "r") as f:
-            logs = f.readlines()
-        
-        for log in logs:
-            if "SUCCESSFUL" in log:
-                log_text.insert(tk.END, log, "success")
-            else:
-                log_text.insert(tk.END, log, "failure")
-        
         # Configure tags
         log_text.tag_config("success", foreground=self.success_color)
         log_text.tag_config("failure", foreground=self.highlight_color)
         
-        # Make text read-only
-        log_text.config(state=tk.DISABLED)
+        # Paging state: cursors of the pages before this one, and of the next older page
+        page = {'cursor': None, 'history': [], 'next': None}
+        
+        def show_page(cursor):
+            """Load one page of entries matching the filters"""
+            if cursor is None:
+                page['history'] = []
+            page['cursor'] = cursor
+            filters = {
+                'user': None if user_var.get() == "All" else user_var.get(),
+                'outcome': None if outcome_var.get() == "All" else outcome_var.get(),
+                'event': None if event_var.get() == "All" else event_var.get(),
+            }
+            entries, page['next'] = self.security_log.query(limit=100, before=cursor, **filters)
+            
+            log_text.config(state=tk.NORMAL)
+            log_text.delete(1.0, tk.END)
+            for entry in entries:
+                log_text.insert(tk.END, describe(entry) + "\n", entry['outcome'])
+            if not entries:
+                log_text.insert(tk.END, "No matching log entries.\n")
+            
+            # Make text read-only
+            log_text.config(state=tk.DISABLED)
+            older_button.config(state=tk.NORMAL if page['next'] else tk.DISABLED)
+            newer_button.config(state=tk.NORMAL if cursor is not None else tk.DISABLED)
+        
+        def show_older():
+            page['history'].append(page['cursor'])
+            show_page(page['next'])
+        
+        def show_newer():
+            cursor = page['history'].pop() if page['history'] else None
+            history = page['history']
+            show_page(cursor)
+            page['history'] = history
+        
+        def tail():
+            """Refresh the newest page while it is showing, so new events appear"""
+            if not logs_window.winfo_exists():
+                return
+            if page['cursor'] is None:
+                show_page(None)
+            logs_window.after(2000, tail)
+        
+        # Paging and clear buttons
+        buttons_frame = tk.Frame(logs_frame, bg=self.bg_color)
+        buttons_frame.pack(pady=10)
+        newer_button = tk.Button(buttons_frame, text="< Newer", bg=self.panel_color, fg=self.text_color,
+                                 command=show_newer)
+        newer_button.pack(side=tk.LEFT, padx=5)
+        older_button = tk.Button(buttons_frame, text="Older >", bg=self.panel_color, fg=self.text_color,
+                                 command=show_older)
+        older_button.pack(side=tk.LEFT, padx=5)
         
         # Add clear logs button
-        tk.Button(logs_frame, text="Clear Logs", 
+        tk.Button(buttons_frame, text="Clear Logs", 
                  bg=self.highlight_color, fg=self.bg_color,
-                 command=lambda: self.clear_logs(log_text)).pack(pady=10)
+                 command=lambda: self.clear_logs(log_text)).pack(side=tk.LEFT, padx=5)
+        
+        self.security_log.flush()
+        tail()
     
     def clear_logs(self, log_text):
         """Clear the security logs"""
-        log_file = os.path.join(self.log_dir, "auth_log.txt")
-        
         # Confirm before clearing
         if messagebox.askyesno("Clear Logs", "Are you sure you want to clear all security logs?"):
-            # Clear the file
-            open(log_file, "w").close()
+            self.security_log.clear()
             
             # Clear the text widget
             log_text.config(state=tk.NORMAL)
@@ -379,9 +411,7 @@ class AuthenticationApp:
         """Register a new user"""
         # Stop camera if running
         if hasattr(self, 'is_running') and self.is_running:
-            self.is_running = False
-            if hasattr(self, 'cap') and self.cap.isOpened():
-                self.cap.release()
+            self.stop_camera()
             time.sleep(0.5)  # Give time for threads to stop
         
         # Create a simple dialog for name input
@@ -430,11 +460,41 @@ class AuthenticationApp:
         
         # Update status
         self.status_var.set(f"Registering {name}... Look at the camera and follow instructions")
-        self.root.update()
+        self.register_button.config(state=tk.DISABLED)
         
-        # Start registration process
+        # Collect and train in the background; keep the preview running meanwhile
         try:
-            user_id = self.face_system.register_new_user(name)
+            self.registration = self.face_system.start_registration(name, source=self.camera_source)
+        except Exception as e:
+            self.register_button.config(state=tk.NORMAL)
+            messagebox.showerror("Error", f"Registration failed: {str(e)}")
+            self.status_var.set("Registration failed. Please try again.")
+            return
+        
+        self.camera.acquire()
+        self.camera_acquired = True
+        self.preview.start()
+        self.poll_registration(name)
+    
+    def poll_registration(self, name):
+        """Show registration progress and finish up once the pipeline is done"""
+        progress = self.registration.progress()
+        
+        if not self.registration.finished:
+            if progress['state'] == self.registration.TRAINING:
+                self.status_var.set(f"Registering {name}... training")
+            else:
+                rejected = sum(count for reason, count in progress['rejected'].items()
+                               if reason not in ("no face", "busy"))
+                self.status_var.set(f"Registering {name}... {progress['accepted']}/{progress['target']} samples"
+                                    f" ({rejected} rejected)")
+            self.root.after(100, lambda: self.poll_registration(name))
+            return
+        
+        self.stop_camera()
+        self.register_button.config(state=tk.NORMAL)
+        
+        if progress['state'] == self.registration.DONE:
             messagebox.showinfo("Success", f"Registration successful for {name}!")
             
             # Log the registration
@@ -444,26 +504,19 @@ class AuthenticationApp:
             self.status_var.set("Looking for a registered face...")
             self.has_registered_users = True
             self.start_camera()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Registration failed: {str(e)}")
+        else:
+            messagebox.showerror("Error", f"Registration failed: {progress['error']}")
             self.status_var.set("Registration failed. Please try again.")
     
     def log_registration(self, name):
         """Log user registration"""
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_file = os.path.join(self.log_dir, "auth_log.txt")
-        
-        with open(log_file, "a") as f:
-            f.write(f"{timestamp} - NEW USER REGISTERED: {name}\n")
+        self.security_log.log("registration", "success", name)
     
     def manage_users(self):
         """Open a window to manage registered users"""
         # Stop camera if running
         if hasattr(self, 'is_running') and self.is_running:
-            self.is_running = False
-            if hasattr(self, 'cap') and self.cap.isOpened():
-                self.cap.release()
+            self.stop_camera()
             time.sleep(0.5)  # Give time for threads to stop
         
         # Create user management window
@@ -550,17 +603,10 @@ class AuthenticationApp:
         
         # Confirm deletion
         if messagebox.askyesno("Confirm Deletion", f"Are you sure you want to delete {user_name}?"):
-            # Delete the user
-            del self.face_system.face_data[user_id]
+            # Delete the user along with their feature shard
+            self.face_system.delete_user(user_id)
             
-            # Save the updated face data
-            self.face_system.save_face_data()
-            
-            # Retrain the model if there are still users
-            if self.face_system.face_data:
-                # This is a simplified approach - in a real app, you'd need to retrain with all remaining users' face data
-                messagebox.showinfo("Info", "User deleted. You may need to retrain the model.")
-            else:
+            if not self.face_system.face_data:
                 # No more users
                 self.has_registered_users = False
             
@@ -573,11 +619,7 @@ class AuthenticationApp:
     
     def log_user_deletion(self, name):
         """Log user deletion"""
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_file = os.path.join(self.log_dir, "auth_log.txt")
-        
-        with open(log_file, "a") as f:
-            f.write(f"{timestamp} - USER DELETED: {name}\n")
+        self.security_log.log("deletion", "success", name)
     
     def skip_authentication(self):
         """Skip authentication (for development/testing)"""
@@ -589,9 +631,7 @@ class AuthenticationApp:
         """Launch the main voice assistant application"""
         # Stop camera if running
         if hasattr(self, 'is_running') and self.is_running:
-            self.is_running = False
-            if hasattr(self, 'cap') and self.cap.isOpened():
-                self.cap.release()
+            self.stop_camera()
         
         # Hide the authentication window
         self.root.withdraw()
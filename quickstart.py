@@ -1,16 +1,22 @@
 import speech_recognition as sr
 import os
 import subprocess
+import sys
 import webbrowser
 import datetime
 import random
 import platform
 from gtts import gTTS
-import playsound
 import time
 import json
 import requests
 import re
+import hashlib
+import io
+import shutil
+import queue
+import itertools
+import argparse
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -29,7 +35,16 @@ import threading
 from pytube import YouTube
 import speedtest
 import cv2
+import numpy as np
+from collections import deque
 from datetime import datetime, timedelta
+from camera_service import CameraService
+
+try:
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+except ImportError:
+    pygame = None
 
 # Import Google Calendar functionality
 from google.auth.transport.requests import Request
@@ -41,6 +56,482 @@ from googleapiclient.errors import HttpError
 # Google Calendar API scopes
 SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
 
+HELP_TEXT = (
+    "I can help you with: "
+    "time, date, weather, calendar events, reminders, "
+    "send emails, news updates, web searches, Wikipedia info, "
+    "system information, jokes, screenshots, stock prices, "
+    "translations, internet speed tests, general knowledge questions, "
+    "and more. Just ask!"
+)
+
+# Fixed phrases synthesized into the TTS cache at startup
+STATIC_PHRASES = [
+    "I'm ready to assist you. Say 'help' for a list of commands.",
+    "I didn't catch that. Can you please repeat?",
+    "I'm not sure how to help with that yet. Try asking for help to see what I can do.",
+    "Sorry, I encountered an error processing your request. Please try again.",
+    "What would you like me to remind you about?",
+    "When should I remind you? You can say something like '3:30 PM' or 'in 30 minutes'.",
+    "Goodbye! Have a great day!",
+    "Reminder:",
+    HELP_TEXT,
+]
+
+# Speech priorities, lower plays first; reminders jump ahead of queued responses
+PRIORITY_REMINDER = 0
+PRIORITY_RESPONSE = 1
+
+# Words whose trailing period doesn't end a sentence
+ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "e.g.", "i.e.", "etc.", "no."}
+
+
+def split_speech(text, max_chars=150):
+    """Split a response into sentences or clauses that can be synthesized one at a time
+
+    Sentences end at . ! ? ; or : followed by whitespace, so times like 3:30
+    and decimals stay whole. Sentences longer than max_chars are cut at the
+    last comma (or space) before the limit.
+    """
+    sentences = []
+    for piece in re.split(r"(?<=[.!?:;])\s+", text.strip()):
+        # Re-join sentences that were split after an abbreviation
+        if sentences and sentences[-1].split()[-1].lower() in ABBREVIATIONS:
+            sentences[-1] += " " + piece
+        elif piece:
+            sentences.append(piece)
+    
+    chunks = []
+    for sentence in sentences:
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(", ", 0, max_chars)
+            if cut <= 0:
+                cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                break
+            chunks.append(sentence[:cut + 1].strip())
+            sentence = sentence[cut + 1:].strip()
+        if sentence:
+            chunks.append(sentence)
+    return chunks
+
+
+class TTSCache:
+    """Synthesized speech on disk, keyed by a hash of the text and voice settings
+
+    Entries are plain audio files named after their key, with the extension
+    of the format the backend produced. A hit touches the file's mtime, so
+    when the cache grows past max_bytes the least recently used entries are
+    evicted first.
+    """
+
+    def __init__(self, cache_dir="tts_cache", max_bytes=50 * 1024 * 1024, extension=".mp3"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.extension = extension
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.total_bytes = sum(os.path.getsize(path) for path in self.entries())
+
+    def key(self, text, **settings):
+        """Content address of an utterance"""
+        payload = json.dumps({'text': text, **settings}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key, extension=None):
+        """File holding an entry"""
+        return os.path.join(self.cache_dir, key + (extension or self.extension))
+
+    def entries(self):
+        """Paths of every cached entry"""
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                if not name.endswith(".tmp")]
+
+    def get(self, key, extension=None):
+        """Path of a cached entry, or None; counts the hit or miss"""
+        path = self.path(key, extension)
+        with self.lock:
+            if os.path.exists(path):
+                self.hits += 1
+                os.utime(path)  # mark as recently used
+                return path
+            self.misses += 1
+            return None
+
+    def put(self, key, audio, extension=None):
+        """Store synthesized audio bytes and return the entry's path"""
+        path = self.path(key, extension)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+
+        with self.lock:
+            if os.path.exists(path):
+                self.total_bytes -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self.total_bytes += len(audio)
+            if self.total_bytes > self.max_bytes:
+                self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits (caller holds the lock)"""
+        entries = sorted(self.entries(), key=os.path.getmtime)
+        for path in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self.total_bytes -= os.path.getsize(path)
+            os.remove(path)
+
+    def stats(self):
+        """Hit/miss counters and size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries()),
+                'bytes': self.total_bytes,
+            }
+
+
+class TTSBackend:
+    """Common interface of the text to speech engines
+
+    synthesize() returns the encoded audio for a piece of text and records
+    how long it took, so engines can be compared on the machine they run
+    on. An engine that fails is skipped for retry_after seconds, letting
+    the assistant fall back to the next one without paying for the failure
+    on every sentence.
+    """
+
+    name = "tts"
+    extension = ".mp3"
+    retry_after = 60.0
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+        self.failed_at = None
+
+    def settings(self):
+        """Everything that changes how the audio sounds, for the cache key"""
+        return {}
+
+    def available(self):
+        """Whether the engine is installed here"""
+        return True
+
+    def usable(self):
+        """Whether the engine hasn't failed recently"""
+        return self.failed_at is None or time.time() - self.failed_at > self.retry_after
+
+    def synthesize(self, text):
+        """Audio bytes for text"""
+        start = time.perf_counter()
+        try:
+            audio = self._synthesize(text)
+        except Exception:
+            self.failed_at = time.time()
+            raise
+        self.failed_at = None
+        self.last_ms = (time.perf_counter() - start) * 1000
+        self.calls += 1
+        self.total_ms += self.last_ms
+        return audio
+
+    def _synthesize(self, text):
+        raise NotImplementedError
+
+    @property
+    def mean_ms(self):
+        """Average synthesis time so far"""
+        return self.total_ms / self.calls if self.calls else 0.0
+
+    def stats(self):
+        """Per-call latency summary"""
+        return {
+            'backend': self.name,
+            'calls': self.calls,
+            'last_ms': self.last_ms,
+            'mean_ms': self.mean_ms,
+        }
+
+
+class GTTSBackend(TTSBackend):
+    """Google Text-to-Speech; natural voice, but every sentence is a network round trip"""
+
+    name = "gtts"
+    extension = ".mp3"
+
+    def __init__(self, lang="en", tld="com", slow=False, timeout=3.0):
+        super().__init__()
+        self.lang = lang
+        self.tld = tld
+        self.slow = slow
+        # Seconds per request; a network that silently drops packets would otherwise
+        # stall the turn for the OS connect timeout before falling back
+        self.timeout = timeout
+
+    def settings(self):
+        return {'lang': self.lang, 'tld': self.tld, 'slow': self.slow}
+
+    def _synthesize(self, text):
+        tts = gTTS(text=text, timeout=self.timeout, **self.settings())
+        audio = io.BytesIO()
+        tts.write_to_fp(audio)
+        return audio.getvalue()
+
+
+class EspeakBackend(TTSBackend):
+    """espeak-ng (or espeak) run locally; robotic, but offline and fast
+
+    The engine writes a WAV file to stdout, so nothing touches the disk
+    outside the TTS cache.
+    """
+
+    name = "espeak"
+    extension = ".wav"
+
+    def __init__(self, voice="en", speed=160, pitch=50, executable=None):
+        super().__init__()
+        self.voice = voice
+        self.speed = speed
+        self.pitch = pitch
+        self.executable = executable or shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def settings(self):
+        return {'voice': self.voice, 'speed': self.speed, 'pitch': self.pitch}
+
+    def available(self):
+        return self.executable is not None
+
+    def _synthesize(self, text):
+        result = subprocess.run(
+            [self.executable, "--stdout", "-v", self.voice, "-s", str(self.speed), "-p", str(self.pitch), "--", text],
+            capture_output=True, timeout=30, check=True)
+        return result.stdout
+
+
+TTS_BACKENDS = {
+    'gtts': GTTSBackend,
+    'espeak': EspeakBackend,
+}
+
+# gTTS sounds best; espeak takes over when the network is down
+DEFAULT_TTS_CONFIG = {'backends': ['gtts', 'espeak']}
+
+
+def create_tts_backends(config=None):
+    """Installed backends in order of preference, from {'backends': [names], name: {options}}"""
+    config = config or DEFAULT_TTS_CONFIG
+    backends = []
+    for name in config.get('backends', DEFAULT_TTS_CONFIG['backends']):
+        if name not in TTS_BACKENDS:
+            print(f"Unknown text to speech backend '{name}', expected one of {', '.join(TTS_BACKENDS)}")
+            continue
+        backend = TTS_BACKENDS[name](**config.get(name, {}))
+        if backend.available():
+            backends.append(backend)
+        else:
+            print(f"Text to speech backend '{name}' is not installed, skipping it")
+    if not backends:
+        backends.append(GTTSBackend())
+    return backends
+
+
+def compare_tts_backends(phrases=None, config=None):
+    """Synthesize the same phrases with every installed backend and report the latency of each"""
+    phrases = phrases or STATIC_PHRASES[:6]
+    config = config or {}
+    results = {}
+    for name, backend_class in TTS_BACKENDS.items():
+        backend = backend_class(**config.get(name, {}))
+        if not backend.available():
+            print(f"{name}: not installed")
+            continue
+        timings = []
+        try:
+            for phrase in phrases:
+                backend.synthesize(phrase)
+                timings.append(backend.last_ms)
+        except Exception as e:
+            print(f"{name}: failed ({str(e)})")
+            continue
+        timings.sort()
+        results[name] = {
+            'phrases': len(timings),
+            'median_ms': timings[len(timings) // 2],
+            'max_ms': timings[-1],
+            'mean_ms': backend.mean_ms,
+        }
+        print(f"{name}: median {results[name]['median_ms']:.0f} ms, max {results[name]['max_ms']:.0f} ms "
+              f"over {len(timings)} phrases")
+    return results
+
+
+class AudioClip:
+    """One synthesized chunk of speech, as bytes in memory and/or a cached file"""
+
+    def __init__(self, path=None, audio=None):
+        self.path = path
+        self.audio = audio
+
+    def data(self):
+        """The encoded audio bytes"""
+        if self.audio is None:
+            with open(self.path, "rb") as f:
+                self.audio = f.read()
+        return self.audio
+
+
+class Utterance:
+    """Speech waiting for, or being played by, the audio output"""
+
+    def __init__(self, text, clips, priority=PRIORITY_RESPONSE):
+        self.text = text
+        self.clips = clips  # iterable of AudioClip, possibly still being synthesized
+        self.priority = priority
+        self.queued_at = time.perf_counter()
+        self.first_audio_at = None
+        self.interrupted = None  # why playback was cut short, e.g. "stop" or "barge-in"
+        self.cancelled = threading.Event()  # set when interrupted, or when playback ends early on an error
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until played or interrupted; re-raises a synthesis or playback error. False on timeout"""
+        if not self.done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def interrupt(self, reason):
+        """Cut playback short and stop synthesizing the rest"""
+        self.interrupted = reason
+        self.cancelled.set()
+
+
+# Run by the player process when pygame isn't available
+PLAYSOUND_SCRIPT = "import sys, playsound; playsound.playsound(sys.argv[1], block=True)"
+
+
+class AudioOutput:
+    """The one place speech is played from, so utterances never overlap
+
+    Utterances from any thread go into a priority queue and a single worker
+    plays them in priority order, first come first served within a
+    priority. Clips are played from memory through pygame's mixer when it is
+    installed; otherwise playsound plays the clip's cached file in a child
+    process, since playsound itself can't be stopped once it has started.
+
+    stop() cuts the current utterance short and drops everything queued
+    before the call; playback stops at once either way.
+    """
+
+    def __init__(self, on_first_audio=None):
+        self.on_first_audio = on_first_audio
+        self.pending = queue.PriorityQueue()
+        self.sequence = itertools.count()  # keeps equal priorities in FIFO order
+        self.mixer = self._init_mixer()
+
+        self.lock = threading.Lock()
+        self.current = None
+        self.cancel_before = 0  # utterances queued before the last stop() are dropped
+        self.cancel_reason = None
+
+        self.thread = threading.Thread(target=self._play_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _init_mixer(self):
+        """Whether pygame can play audio here"""
+        if pygame is None:
+            return False
+        try:
+            pygame.mixer.init()
+            return True
+        except pygame.error as e:
+            print(f"No in-memory audio playback, falling back to playsound: {str(e)}")
+            return False
+
+    def submit(self, utterance):
+        """Queue an utterance and return it; call wait() on it to block until played"""
+        self.pending.put((utterance.priority, next(self.sequence), utterance))
+        return utterance
+
+    @property
+    def speaking(self):
+        """Whether an utterance is playing right now"""
+        return self.current is not None
+
+    def stop(self, reason="stop"):
+        """Interrupt the current utterance and drop the queued ones"""
+        with self.lock:
+            self.cancel_before = next(self.sequence)
+            self.cancel_reason = reason
+            if self.current is not None:
+                self.current.interrupt(reason)
+
+    def _play_loop(self):
+        """Play queued utterances one at a time"""
+        while True:
+            _, sequence, utterance = self.pending.get()
+            with self.lock:
+                if sequence < self.cancel_before:
+                    utterance.interrupt(self.cancel_reason)
+                    utterance.done.set()
+                    continue
+                self.current = utterance
+
+            try:
+                for clip in utterance.clips:
+                    if utterance.interrupted:
+                        break
+                    if utterance.first_audio_at is None:
+                        utterance.first_audio_at = time.perf_counter()
+                        if self.on_first_audio is not None:
+                            self.on_first_audio(utterance.first_audio_at - utterance.queued_at)
+                    self.play(clip)
+            except Exception as e:
+                print(f"Error speaking: {str(e)}")
+                utterance.error = e
+                utterance.cancelled.set()
+            finally:
+                with self.lock:
+                    self.current = None
+                utterance.done.set()
+
+    def play(self, clip):
+        """Play one clip to the end, or until the current utterance is interrupted"""
+        if self.mixer:
+            sound = pygame.mixer.Sound(file=io.BytesIO(clip.data()))
+            channel = sound.play()
+            while channel is not None and channel.get_busy():
+                if self.current is not None and self.current.interrupted:
+                    channel.stop()
+                    break
+                time.sleep(0.01)
+        else:
+            player = subprocess.Popen([sys.executable, "-c", PLAYSOUND_SCRIPT, clip.path])
+            while player.poll() is None:
+                if self.current is not None and self.current.interrupted:
+                    player.terminate()
+                    player.wait()
+                    return
+                time.sleep(0.01)
+            if player.returncode != 0:
+                raise RuntimeError(f"playsound exited with status {player.returncode}")
+
+
 class VoiceAssistant:
     def __init__(self, name="Assistant"):
         self.name = name
@@ -60,6 +551,11 @@ class VoiceAssistant:
         # Initialize APIs
         self.news_api = None
         
+        # Text to speech backends, overridden by the "tts" section of the config file
+        self.tts_config = dict(DEFAULT_TTS_CONFIG)
+        # Barge-in is opt-in ("barge_in": true in the config file); see below
+        self.barge_in = False
+        
         # Try to load API keys from config file
         self.setup_api_keys()
         
@@ -74,6 +570,22 @@ class VoiceAssistant:
         self.continuous_listening = False
         self.volume = 1.0  # Default volume level
         
+        # Barge-in: stop talking as soon as the user starts speaking over the assistant.
+        # Speech must be barge_in_ratio times louder than the listening threshold for
+        # barge_in_min_speech seconds. There is no echo cancellation, so with speakers
+        # the assistant's own voice trips this; only enable it with a headset.
+        self.barge_in_ratio = 1.5
+        self.barge_in_min_speech = 0.3
+        self.barge_in_audio = None  # what the user said while interrupting, for listen() to carry on from
+        
+        # Text to speech engines in order of preference and the on-disk cache of synthesized phrases
+        self.tts_backends = create_tts_backends(self.tts_config)
+        self.tts_cache = TTSCache()
+        self.prewarm_tts_cache()
+        # Seconds from speak() being called to the first chunk starting to play
+        self.time_to_first_audio = deque(maxlen=50)
+        self.audio_output = AudioOutput(on_first_audio=self.time_to_first_audio.append)
+        
         # Command history
         self.command_history = []
         self.max_history = 10
@@ -97,6 +609,8 @@ class VoiceAssistant:
                     self.weather_api_key = config.get('weather_api_key', self.weather_api_key)
                     self.news_api_key = config.get('news_api_key', self.news_api_key)
                     self.wolfram_app_id = config.get('wolfram_app_id', self.wolfram_app_id)
+                    self.tts_config = config.get('tts', self.tts_config)
+                    self.barge_in = config.get('barge_in', self.barge_in)
                     
                     # Initialize APIs with the loaded keys
                     if self.news_api_key != "YOUR_NEWS_API_KEY":
@@ -111,7 +625,9 @@ class VoiceAssistant:
                 template_config = {
                     "weather_api_key": "YOUR_OPENWEATHERMAP_API_KEY",
                     "news_api_key": "YOUR_NEWS_API_KEY",
-                    "wolfram_app_id": "YOUR_WOLFRAM_ALPHA_APP_ID"
+                    "wolfram_app_id": "YOUR_WOLFRAM_ALPHA_APP_ID",
+                    "tts": DEFAULT_TTS_CONFIG,
+                    "barge_in": False
                 }
                 with open(config_path, 'w') as f:
                     json.dump(template_config, f, indent=4)
@@ -143,10 +659,19 @@ class VoiceAssistant:
     
     def listen(self):
         """Listen for voice commands"""
+        prefix, self.barge_in_audio = self.barge_in_audio, None
         with sr.Microphone() as source:
             print("Listening...")
-            self.recognizer.adjust_for_ambient_noise(source, duration=1)
-            audio = self.recognizer.listen(source)
+            if prefix is None:
+                self.recognizer.adjust_for_ambient_noise(source, duration=1)
+                audio = self.recognizer.listen(source)
+            else:
+                # The user interrupted the assistant and is mid-sentence; carry on from what was heard
+                try:
+                    rest = self.recognizer.listen(source, timeout=1)
+                    audio = sr.AudioData(prefix.frame_data + rest.frame_data, prefix.sample_rate, prefix.sample_width)
+                except sr.WaitTimeoutError:
+                    audio = prefix
             
         try:
             print("Recognizing...")
@@ -166,18 +691,173 @@ class VoiceAssistant:
             print("Sorry, my speech service is down.")
             return ""
     
-    def speak(self, text):
-        """Convert text to speech and play it"""
+    def speak(self, text, priority=PRIORITY_RESPONSE, wait=True):
+        """Convert text to speech and play it, one sentence at a time
+        
+        Speech is queued on the audio output, so calls from several threads
+        play one after another. With wait=False this returns as soon as the
+        text is queued; either way the Utterance is returned. While waiting,
+        the microphone is watched for barge-in, and utterance.interrupted is
+        "barge-in" if the user talked over it.
+        """
         print(f"{self.name}: {text}")
-        tts = gTTS(text=text, lang='en')
-        temp_file = "temp_voice.mp3"
-        tts.save(temp_file)
+        utterance = Utterance(text, None, priority)
+        utterance.clips = self.synthesize_ahead(text, utterance.cancelled)
+        self.audio_output.submit(utterance)
+        if wait:
+            if self.barge_in:
+                self.watch_for_barge_in(utterance)
+            utterance.wait()
+        return utterance
+    
+    def stop_speaking(self):
+        """Cut the current utterance short and drop any queued speech"""
+        self.audio_output.stop()
+    
+    def watch_for_barge_in(self, utterance):
+        """Listen while an utterance is queued or playing and stop playback if the user speaks
+        
+        The audio heard from a little before the user started talking is kept
+        in barge_in_audio, so the next listen() doesn't lose the start of the
+        command.
+        """
+        try:
+            with sr.Microphone() as source:
+                seconds_per_chunk = source.CHUNK / source.SAMPLE_RATE
+                needed = max(1, int(round(self.barge_in_min_speech / seconds_per_chunk)))
+                heard = deque(maxlen=needed + int(0.3 / seconds_per_chunk))
+                loud = 0
+                
+                while not utterance.done.is_set():
+                    buffer = source.stream.read(source.CHUNK)
+                    heard.append(buffer)
+                    samples = np.frombuffer(buffer, dtype=np.int16).astype(np.float64)
+                    energy = np.sqrt(np.mean(samples ** 2)) if len(samples) else 0.0
+                    loud = loud + 1 if energy > self.recognizer.energy_threshold * self.barge_in_ratio else 0
+                    
+                    if loud >= needed:
+                        print("Barge-in, listening...")
+                        self.audio_output.stop("barge-in")
+                        self.barge_in_audio = sr.AudioData(b"".join(heard), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+                        return
+        except Exception as e:
+            # No microphone (or no PyAudio): play without barge-in from now on
+            print(f"Barge-in disabled: {str(e)}")
+            self.barge_in = False
+    
+    def synthesize_ahead(self, text, cancelled=None):
+        """Start synthesizing text sentence by sentence; returns an iterator over the clips
+        
+        Synthesis runs in its own thread from the moment speech is queued, so
+        the first sentence is usually ready by the time the audio output gets
+        to it and later sentences are synthesized while earlier ones play.
+        Synthesis gives up once the cancelled event is set.
+        """
+        # Small queue: stay at most a couple of sentences ahead of playback
+        clips = queue.Queue(maxsize=2)
+        
+        def hand_over(item):
+            while True:
+                try:
+                    clips.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    if cancelled is not None and cancelled.is_set():
+                        return False
+        
+        def synthesize_chunks():
+            for chunk in split_speech(text):
+                if cancelled is not None and cancelled.is_set():
+                    return
+                try:
+                    clip = self.synthesize(chunk)
+                except Exception as e:
+                    hand_over(e)
+                    return
+                if not hand_over(clip):
+                    return
+            hand_over(None)
+        
+        threading.Thread(target=synthesize_chunks, daemon=True).start()
         
-        # Play the audio file with adjusted volume
-        playsound.playsound(temp_file, block=True)
+        def ready_clips():
+            while True:
+                try:
+                    clip = clips.get(timeout=0.1)
+                except queue.Empty:
+                    # Still synthesizing; give up at once if playback was stopped meanwhile
+                    if cancelled is not None and cancelled.is_set():
+                        return
+                    continue
+                if clip is None:
+                    return
+                if isinstance(clip, Exception):
+                    raise clip
+                yield clip
+        
+        return ready_clips()
+    
+    def speech_latency(self):
+        """Median and worst time to first audio over recent utterances, in seconds"""
+        if not self.time_to_first_audio:
+            return None
+        latencies = sorted(self.time_to_first_audio)
+        return {
+            'utterances': len(latencies),
+            'median': latencies[len(latencies) // 2],
+            'max': latencies[-1],
+        }
+    
+    def synthesize(self, text):
+        """Spoken audio for text as an AudioClip, from the cache or synthesized into it
+        
+        Backends are tried in order of preference. A cached clip from a
+        preferred backend is used even while that backend is failing, so
+        common phrases keep their usual voice when offline.
+        """
+        error = None
+        for backend in self.tts_backends:
+            key = self.tts_cache.key(text, backend=backend.name, **backend.settings())
+            cached = self.tts_cache.get(key, backend.extension)
+            if cached:
+                return AudioClip(cached)
+            if not backend.usable():
+                continue
+            try:
+                audio = backend.synthesize(text)
+            except Exception as e:
+                print(f"Text to speech with {backend.name} failed, trying the next backend: {str(e)}")
+                error = e
+                continue
+            return AudioClip(self.tts_cache.put(key, audio, backend.extension), audio)
+        raise error or RuntimeError("No text to speech backend is usable")
+    
+    def tts_stats(self):
+        """Synthesis latency of every configured backend"""
+        return [backend.stats() for backend in self.tts_backends]
+    
+    def prewarm_tts_cache(self):
+        """Synthesize the fixed phrases in the background so they play without a network round trip"""
+        phrases = [f"Hello, I am {self.name}, your voice assistant. How can I help you today?"] + STATIC_PHRASES
+        # speak() synthesizes and looks up sentence chunks, so those are what gets cached
+        chunks = list(dict.fromkeys(chunk for phrase in phrases for chunk in split_speech(phrase)))
         
-        # Clean up the temporary file
-        os.remove(temp_file)
+        backend = self.tts_backends[0]
+        
+        def prewarm():
+            for chunk in chunks:
+                key = self.tts_cache.key(chunk, backend=backend.name, **backend.settings())
+                if os.path.exists(self.tts_cache.path(key, backend.extension)):
+                    continue
+                try:
+                    # Straight into the cache, so prewarming doesn't skew the hit/miss counters
+                    self.tts_cache.put(key, backend.synthesize(chunk), backend.extension)
+                except Exception as e:
+                    print(f"Could not prewarm speech cache: {str(e)}")
+                    return
+            print(f"Speech cache ready: {self.tts_cache.stats()}")
+        
+        threading.Thread(target=prewarm, daemon=True).start()
     
     def get_time(self):
         """Get current time"""
@@ -439,7 +1119,7 @@ class VoiceAssistant:
             # Remove due reminders from the list
             for reminder in due_reminders:
                 self.reminders.remove(reminder)
-                self.speak(f"Reminder: {reminder['text']}")
+                self.speak(f"Reminder: {reminder['text']}", priority=PRIORITY_REMINDER, wait=False)
             
             # Sleep for a short time before checking again
             time.sleep(10)  # Check every 10 seconds
@@ -716,35 +1396,31 @@ class VoiceAssistant:
     
     def take_photo(self):
         """Take a photo using the webcam"""
+        camera = CameraService.get(0)
         try:
-            # Initialize camera
-            cap = cv2.VideoCapture(0)
-            
-            if not cap.isOpened():
+            # The shared camera service keeps the device open, so there's no warm-up wait
+            if not camera.acquire():
                 return "Sorry, I couldn't access the webcam."
             
-            # Wait a moment for the camera to initialize
             self.speak("Taking a photo in 3... 2... 1...")
-            time.sleep(3)
             
-            # Capture frame
-            ret, frame = cap.read()
+            # Capture the newest frame grabbed after the countdown
+            latest = camera.latest()
+            camera_frame = camera.wait_for_frame(latest.frame_id if latest else 0)
             
-            if not ret:
-                cap.release()
+            if camera_frame is None:
                 return "Failed to capture image."
             
             # Save the image
             photo_path = os.path.join(os.path.expanduser("~"), "Desktop", f"photo_{int(time.time())}.jpg")
-            cv2.imwrite(photo_path, frame)
-            
-            # Release camera
-            cap.release()
+            cv2.imwrite(photo_path, camera_frame.image)
             
             return f"Photo taken and saved to {photo_path}"
         
         except Exception as e:
             return f"Failed to take photo: {str(e)}"
+        finally:
+            camera.release()
     
     def configure_email(self, email, password):
         """Configure email settings"""
@@ -962,14 +1638,7 @@ class VoiceAssistant:
         
         # Help
         elif "help" in command:
-            return (
-                "I can help you with: "
-                "time, date, weather, calendar events, reminders, "
-                "send emails, news updates, web searches, Wikipedia info, "
-                "system information, jokes, screenshots, stock prices, "
-                "translations, internet speed tests, general knowledge questions, "
-                "and more. Just ask!"
-            )
+            return HELP_TEXT
         
         # Default response
         else:
@@ -1016,7 +1685,9 @@ def create_config_file():
     template_config = {
         "weather_api_key": "YOUR_OPENWEATHERMAP_API_KEY",
         "news_api_key": "YOUR_NEWS_API_KEY",
-        "wolfram_app_id": "YOUR_WOLFRAM_ALPHA_APP_ID"
+        "wolfram_app_id": "YOUR_WOLFRAM_ALPHA_APP_ID",
+        "tts": DEFAULT_TTS_CONFIG,
+        "barge_in": False
     }
     
     # Write to file
@@ -1027,6 +1698,14 @@ def create_config_file():
     print("Please edit this file to add your API keys.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Voice assistant")
+    parser.add_argument("--compare-tts", action="store_true",
+                        help="Compare synthesis latency of the installed text to speech backends and exit")
+    args = parser.parse_args()
+    if args.compare_tts:
+        compare_tts_backends()
+        raise SystemExit
+    
     # Create config file if it doesn't exist
     create_config_file()
     
@@ -0,0 +1,206 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from camera_service import CameraService
+from face_recognition_module import FaceRecognition, FaceTracker
+
+# Emitted when a tracked face gets an identity ("identified") or is found to be nobody we know ("unknown")
+IdentityEvent = namedtuple("IdentityEvent", ["source", "timestamp", "kind", "user_id", "name",
+                                             "confidence", "bbox", "track_id"])
+
+
+class SourceState:
+    """Per-source tracking state; only one worker handles a source at a time"""
+
+    def __init__(self, source, face_system):
+        self.source = source
+        self.camera = CameraService.get(source)
+        self.tracker = FaceTracker(face_system)
+        self.last_frame_id = 0
+        self.busy = False
+        self.identities = {}  # track id -> last reported user id
+
+        self.frames = 0
+        self.dropped = 0
+        self.total_ms = 0.0
+
+
+class RecognitionService:
+    """Runs face recognition for several video sources on a shared worker pool
+
+    Sources can be device indexes, stream URLs, video files or image
+    directories. A scheduler thread hands the newest frame of every idle
+    source to a pool of worker threads (OpenCV and NumPy release the GIL, so
+    they use all cores); frames that arrive while a source is still being
+    processed are skipped rather than queued. Each source keeps its own face
+    tracker, and an IdentityEvent is emitted whenever one of its tracks is
+    identified or turns out to be unknown.
+    """
+
+    def __init__(self, face_system, sources, workers=None, confidence_threshold=60, on_event=None):
+        self.face_system = face_system
+        self.confidence_threshold = confidence_threshold
+        self.workers = workers or os.cpu_count() or 1
+        self.on_event = on_event
+        self.events = queue.Queue()
+
+        self.sources = [SourceState(source, face_system) for source in sources]
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.pool = None
+        self.thread = None
+
+    def start(self):
+        """Open every source and start scheduling frames"""
+        self.running = True
+        for state in self.sources:
+            if not state.camera.acquire():
+                print(f"Could not open video source {state.source}")
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.thread = threading.Thread(target=self._schedule)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop scheduling, wait for in-flight frames and release the sources
+
+        Sources nobody else is using are closed before this returns, so
+        their grabber threads are gone when the caller exits.
+        """
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+        for state in self.sources:
+            state.camera.release(linger=0)
+
+    def stats(self):
+        """Frames processed, frames skipped and mean processing time per source"""
+        with self.lock:
+            return {
+                state.source: {
+                    'frames': state.frames,
+                    'dropped': state.dropped,
+                    'mean_ms': state.total_ms / state.frames if state.frames else 0.0,
+                }
+                for state in self.sources
+            }
+
+    def _schedule(self):
+        """Submit the newest frame of each idle source to the pool"""
+        while self.running:
+            submitted = False
+            for state in self.sources:
+                camera_frame = state.camera.latest()
+                if camera_frame is None or camera_frame.frame_id == state.last_frame_id:
+                    continue
+
+                with self.lock:
+                    if state.busy:
+                        continue
+                    if state.last_frame_id:
+                        state.dropped += camera_frame.frame_id - state.last_frame_id - 1
+                    state.last_frame_id = camera_frame.frame_id
+                    state.busy = True
+                self.pool.submit(self._process, state, camera_frame)
+                submitted = True
+
+            if not submitted:
+                # Nothing new anywhere; poll again shortly or when a worker finishes
+                self.wakeup.wait(0.005)
+                self.wakeup.clear()
+
+    def _detector(self):
+        """This worker thread's own detector; cascades and DNN nets aren't thread safe"""
+        if not hasattr(self.local, 'detector'):
+            self.local.detector = self.face_system.new_detector()
+        return self.local.detector
+
+    def _process(self, state, camera_frame):
+        """Track and recognize one frame of one source"""
+        start = time.perf_counter()
+        try:
+            state.tracker.detector = self._detector()
+            results = state.tracker.update(camera_frame.image, self.confidence_threshold)
+            self._emit(state, camera_frame.timestamp, results)
+        except Exception as e:
+            print(f"Recognition failed on source {state.source}: {e}")
+        finally:
+            with self.lock:
+                state.frames += 1
+                state.total_ms += (time.perf_counter() - start) * 1000
+                state.busy = False
+            self.wakeup.set()
+
+    def _emit(self, state, timestamp, results):
+        """Report tracks whose identity is new or has changed"""
+        live = set()
+        for result in results:
+            track_id = result['track_id']
+            live.add(track_id)
+            user_id = result['user_id'] if result['valid'] else None
+            if track_id in state.identities and state.identities[track_id] == user_id:
+                continue
+            state.identities[track_id] = user_id
+
+            event = IdentityEvent(state.source, timestamp, "identified" if user_id is not None else "unknown",
+                                  user_id, result['name'] if user_id is not None else None,
+                                  result['confidence'], result['bbox'], track_id)
+            self.events.put(event)
+            if self.on_event is not None:
+                self.on_event(event)
+
+        # Forget tracks that have left the frame
+        for track_id in list(state.identities):
+            if track_id not in live:
+                del state.identities[track_id]
+
+
+def parse_source(source):
+    """Device indexes are given as numbers, everything else is a path or URL"""
+    return int(source) if source.isdigit() else source
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognize faces on several video sources at once")
+    parser.add_argument("sources", nargs="+",
+                        help="Camera indexes, stream URLs, video files or image directories")
+    parser.add_argument("--workers", type=int, default=None, help="Worker threads (default: CPU cores)")
+    parser.add_argument("--threshold", type=float, default=60, help="Recognition confidence threshold")
+    parser.add_argument("--seconds", type=float, default=None, help="Stop after this long")
+    args = parser.parse_args()
+
+    def print_event(event):
+        who = event.name if event.kind == "identified" else "unknown face"
+        print(f"[{event.source}] track {event.track_id}: {who} ({event.confidence:.1f})")
+
+    service = RecognitionService(FaceRecognition(), [parse_source(s) for s in args.sources],
+                                 args.workers, args.threshold, print_event)
+    service.start()
+    print(f"Recognizing on {len(service.sources)} sources with {service.workers} workers, Ctrl+C to stop")
+
+    started = time.time()
+    try:
+        while args.seconds is None or time.time() - started < args.seconds:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    service.stop()
+
+    for source, source_stats in service.stats().items():
+        print(f"{source}: {source_stats['frames']} frames, {source_stats['dropped']} skipped, "
+              f"{source_stats['mean_ms']:.1f} ms per frame")
+
+
+if __name__ == "__main__":
+    main()
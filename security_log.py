@@ -0,0 +1,264 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    event TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    user TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_user_ts ON events (user, ts);
+CREATE INDEX IF NOT EXISTS events_outcome_ts ON events (outcome, ts);
+CREATE INDEX IF NOT EXISTS events_event_ts ON events (event, ts);
+"""
+
+# Lines written by the old auth_log.txt logger, imported once on first start
+LEGACY_PATTERNS = [
+    (re.compile(r"SUCCESSFUL LOGIN: (.*) \(time to unlock ([\d.]+)s\)$"), "login", "success"),
+    (re.compile(r"SUCCESSFUL LOGIN: (.*)$"), "login", "success"),
+    (re.compile(r"FAILED LOGIN ATTEMPT()$"), "login", "failure"),
+    (re.compile(r"NEW USER REGISTERED: (.*)$"), "registration", "success"),
+    (re.compile(r"USER DELETED: (.*)$"), "deletion", "success"),
+]
+
+
+def describe(entry):
+    """One human readable line for a log entry, in the old auth_log.txt format"""
+    timestamp = datetime.fromtimestamp(entry['ts']).strftime("%Y-%m-%d %H:%M:%S")
+    event, outcome, user = entry['event'], entry['outcome'], entry['user']
+    details = entry['details']
+
+    if event == "login" and outcome == "success":
+        text = f"SUCCESSFUL LOGIN: {user}"
+        if details.get('unlock_time') is not None:
+            text += f" (time to unlock {details['unlock_time']:.2f}s)"
+    elif event == "login":
+        text = "FAILED LOGIN ATTEMPT"
+    elif event == "registration":
+        text = f"NEW USER REGISTERED: {user}"
+    elif event == "deletion":
+        text = f"USER DELETED: {user}"
+    else:
+        text = f"{event.upper()} {outcome.upper()}: {user or ''}"
+    return f"{timestamp} - {text}"
+
+
+class SecurityLog:
+    """Append-only security event log in SQLite, indexed by time, user and outcome
+
+    log() only queues the event; a writer thread commits queued events in
+    batches every flush_interval seconds. Once the live database holds
+    max_entries events it is renamed to a timestamped archive and a fresh one
+    is started; only the newest max_archives archives are kept. Queries page
+    backwards in time across the live database and the archives.
+    """
+
+    def __init__(self, log_dir, max_entries=100000, max_archives=12, flush_interval=1.0, batch_size=256):
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+        self.db_path = os.path.join(log_dir, "security_log.db")
+        self.max_entries = max_entries
+        self.max_archives = max_archives
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.pending = queue.Queue()
+        self.db_lock = threading.Lock()  # held while the live file is written or rotated
+
+        self.connection = self._connect(self.db_path)
+        self.import_legacy_log(os.path.join(log_dir, "auth_log.txt"))
+
+        self.running = True
+        self.thread = threading.Thread(target=self._write_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _connect(self, path):
+        """Open a database file with the schema in place"""
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def log(self, event, outcome, user=None, **details):
+        """Queue one event; returns immediately"""
+        self.pending.put((time.time(), event, outcome, user, json.dumps(details) if details else None))
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been committed"""
+        done = threading.Event()
+        self.pending.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """Commit queued events and stop the writer"""
+        if self.running:
+            self.flush()
+            self.running = False
+
+    def _write_loop(self):
+        """Commit queued events in batches"""
+        while self.running:
+            batch = []
+            waiters = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.pending.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+
+            if batch:
+                try:
+                    self._commit(batch)
+                except sqlite3.Error as e:
+                    print(f"Error writing security log: {e}")
+            for done in waiters:
+                done.set()
+
+    def _commit(self, batch):
+        """Write one batch in a single transaction, rotating afterwards if the file is full"""
+        with self.db_lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO events (ts, event, outcome, user, details) VALUES (?, ?, ?, ?, ?)", batch)
+            last_id = self.connection.execute("SELECT max(id) FROM events").fetchone()[0] or 0
+            if last_id >= self.max_entries:
+                self._rotate()
+
+    def _rotate(self):
+        """Archive the live database and start a new one"""
+        self.connection.close()
+        archive = os.path.join(self.log_dir, f"security_log-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.db")
+        os.replace(self.db_path, archive)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+        self.connection = self._connect(self.db_path)
+
+        for old in self.archives()[self.max_archives:]:
+            os.remove(old)
+
+    def archives(self):
+        """Archived database files, newest first"""
+        return sorted(glob.glob(os.path.join(self.log_dir, "security_log-*.db")), reverse=True)
+
+    def import_legacy_log(self, path):
+        """Move entries of the old plain text log into the database, once"""
+        if not os.path.exists(path):
+            return
+
+        rows = []
+        with open(path, "r") as f:
+            for line in f:
+                timestamp, _, text = line.rstrip("\n").partition(" - ")
+                try:
+                    ts = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+                except ValueError:
+                    continue
+                for pattern, event, outcome in LEGACY_PATTERNS:
+                    match = pattern.match(text)
+                    if match:
+                        user = match.group(1) or None
+                        details = None
+                        if match.re.groups > 1:
+                            details = json.dumps({'unlock_time': float(match.group(2))})
+                        rows.append((ts, event, outcome, user, details))
+                        break
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO events (ts, event, outcome, user, details) VALUES (?, ?, ?, ?, ?)", rows)
+        os.replace(path, path + ".imported")
+        print(f"Imported {len(rows)} entries from {os.path.basename(path)}")
+
+    def query(self, limit=100, before=None, user=None, outcome=None, event=None, since=None):
+        """One page of entries, newest first, plus the cursor for the next (older) page
+
+        before is the cursor returned with the previous page: the (ts, id) of
+        its oldest entry. It doesn't refer to a file, so it stays valid when
+        the log rotates while a viewer is paging. Filters use the indexes, so
+        a page costs the same however long the log is.
+        """
+        conditions = []
+        params = []
+        for column, value in (("user", user), ("outcome", outcome), ("event", event)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+
+        if before is not None:
+            cursor_ts, cursor_id = before
+            conditions.append("(ts < ? OR (ts = ? AND id < ?))")
+            params += [cursor_ts, cursor_ts, cursor_id]
+
+        sql = "SELECT id, ts, event, outcome, user, details FROM events"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+
+        # Files hold consecutive time ranges, newest first
+        entries = []
+        for path in [self.db_path] + self.archives():
+            for row in self._read(path, sql, params + [limit - len(entries)]):
+                entry_id, ts, event_name, outcome_name, user_name, details = row
+                entries.append({
+                    'id': entry_id, 'ts': ts, 'event': event_name, 'outcome': outcome_name,
+                    'user': user_name, 'details': json.loads(details) if details else {},
+                })
+            if len(entries) >= limit:
+                break
+
+        next_cursor = None
+        if len(entries) >= limit:
+            last = entries[-1]
+            next_cursor = (last['ts'], last['id'])
+        return entries, next_cursor
+
+    def _read(self, path, sql, values):
+        """Run a read query against one database file"""
+        if path == self.db_path:
+            with self.db_lock:
+                return self.connection.execute(sql, values).fetchall()
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return connection.execute(sql, values).fetchall()
+        finally:
+            connection.close()
+
+    def users(self):
+        """Distinct user names across the live database and archives, for filter choices"""
+        users = set()
+        for path in [self.db_path] + self.archives():
+            rows = self._read(path, "SELECT DISTINCT user FROM events WHERE user IS NOT NULL", [])
+            users.update(row[0] for row in rows)
+        return sorted(users)
+
+    def clear(self):
+        """Delete every entry, archives included"""
+        self.flush()
+        with self.db_lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM events")
+            for archive in self.archives():
+                os.remove(archive)